@@ -0,0 +1,78 @@
+"""
+Versioned caching for lists, summaries and reports.
+
+Every cached value belongs to a namespace ("vehicles", "members", "mileage_logs" or
+"reports") and its key embeds the namespace's current version number. Invalidating a
+namespace just increments that number, so all of its keys become unreachable at once
+and expire on their own; nothing has to enumerate or delete keys. The versions are
+bumped by post_save/post_delete receivers in each app's signals module, and explicitly
+by code that writes with update()/bulk_create(), which don't send signals. Either way
+this happens on commit, so no other request can cache data that is about to change.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VEHICLES = 'vehicles'
+MEMBERS = 'members'
+MILEAGE_LOGS = 'mileage_logs'
+REPORTS = 'reports'
+
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def _version_key(namespace):
+    return f'drvc:{namespace}:version'
+
+
+def _key(namespace, version, parts):
+    return ':'.join(['drvc', namespace, f'v{version}', *(str(part).replace(' ', '') for part in parts)])
+
+
+def _new_version():
+    # Time-based, so a version key that was evicted never comes back as an old number
+    return int(time.time() * 1000)
+
+
+def namespace_version(namespace):
+    return cache.get_or_set(_version_key(namespace), _new_version, timeout=None)
+
+
+async def anamespace_version(namespace):
+    return await cache.aget_or_set(_version_key(namespace), _new_version, timeout=None)
+
+
+def invalidate(*namespaces):
+    """Makes every cached value in the given namespaces stale."""
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            # The version was never set, or was evicted
+            cache.add(_version_key(namespace), _new_version(), timeout=None)
+
+
+def invalidate_on_commit(*namespaces, using=None):
+    """Invalidates the namespaces once the current transaction commits (or now, outside one)."""
+    transaction.on_commit(lambda: invalidate(*namespaces), using=using)
+
+
+def cached(namespace, key_parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Returns the cached value for key_parts in namespace, calling compute() on a miss."""
+    key = _key(namespace, namespace_version(namespace), key_parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def acached(namespace, key_parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Async version of cached(); compute is a coroutine function."""
+    key = _key(namespace, await anamespace_version(namespace), key_parts)
+    value = await cache.aget(key)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    return value
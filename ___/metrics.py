@@ -0,0 +1,293 @@
+"""
+Per-view request metrics and budgets.
+
+RequestMetricsMiddleware measures every request's wall time, number of queries and time
+spent in the database, and files them under the resolved URL name (e.g.
+"member_detail", "admin:index"). The measurements are aggregated into histograms that
+metrics_view serves in the Prometheus text format, to staff only. Each process keeps
+its own histograms, so with several workers each one reports the requests it served.
+
+Queries are counted by an execute wrapper installed on every database connection,
+which adds to the stats of the request running in the current context (a ContextVar,
+which also follows async views' ORM calls into the threads that run them).
+
+REQUEST_BUDGETS sets the most queries, database seconds and wall seconds a view may
+use, per URL name with a 'default' for the rest:
+
+    REQUEST_BUDGETS = {
+        'default': {'queries': 50, 'db_time': 0.5, 'time': 2.0},
+        'member_detail': {'queries': 6},
+    }
+
+An over-budget request is logged as a warning and counted, or, with
+REQUEST_BUDGET_ACTION = 'raise', fails with BudgetExceeded. Tests run under
+___.test_runner.test_budgets(), which raises on query budgets only, as time budgets
+depend on the machine.
+
+A streaming response is measured when its content has been sent, so queries and time
+spent generating it count towards its view.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED = '<unresolved>'
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+BUDGETS = {
+    'queries': "queries",
+    'db_time': "database seconds",
+    'time': "seconds",
+}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+# Connections opened from now on, in any thread; the ones already open in this thread are
+# covered by RequestMetricsMiddleware.
+connection_created.connect(install_query_recorder, dispatch_uid='___.metrics')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:g}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class _ViewMetrics:
+    def __init__(self):
+        self.time = Histogram(SECONDS_BUCKETS)
+        self.db_time = Histogram(SECONDS_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.over_budget = dict.fromkeys(BUDGETS, 0)
+
+
+class MetricsRegistry:
+    """The histograms of every view, keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, stats, wall_time, exceeded=()):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = _ViewMetrics()
+            metrics.time.observe(wall_time)
+            metrics.db_time.observe(stats.db_time)
+            metrics.queries.observe(stats.queries)
+            for budget in exceeded:
+                metrics.over_budget[budget] += 1
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def render(self):
+        """Returns every view's histograms in the Prometheus text exposition format."""
+        families = [
+            ('drvc_request_duration_seconds', "Wall time of requests, by view.", 'time'),
+            ('drvc_request_db_seconds', "Time requests spent in database queries, by view.", 'db_time'),
+            ('drvc_request_queries', "Database queries per request, by view.", 'queries'),
+        ]
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            for name, help_text, attribute in families:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for view, metrics in views:
+                    lines += getattr(metrics, attribute).render(name, f'view="{_escape(view)}"')
+            lines += [
+                '# HELP drvc_request_over_budget_total Requests that exceeded a budget, by view and budget.',
+                '# TYPE drvc_request_over_budget_total counter',
+            ]
+            for view, metrics in views:
+                for budget, count in metrics.over_budget.items():
+                    lines.append(f'drvc_request_over_budget_total{{view="{_escape(view)}",budget="{budget}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def view_budget(view):
+    """Returns the budgets for a URL name: its own entry in REQUEST_BUDGETS over the default."""
+    budgets = getattr(settings, 'REQUEST_BUDGETS', {})
+    return {**budgets.get('default', {}), **budgets.get(view, {})}
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each request's wall time, query count and database time under its URL name,
+    and checks them against REQUEST_BUDGETS. Works in both sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if response.streaming:
+            return self.measure_stream(request, response, stats, started)
+        self.finish(request, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if response.streaming:
+            return self.measure_stream(request, response, stats, started)
+        self.finish(request, stats, time.perf_counter() - started)
+        return response
+
+    def measure_stream(self, request, response, stats, started):
+        """
+        Wraps a streaming response's content so the queries made while generating each
+        chunk are counted, and the request is measured once the content is exhausted.
+        A response closed before that (a client gone away) is recorded but never raises.
+        """
+        if response.is_async:
+            async def content(chunks):
+                chunks = aiter(chunks)
+                completed = False
+                try:
+                    while True:
+                        token = _current.set(stats)
+                        try:
+                            chunk = await anext(chunks)
+                        except StopAsyncIteration:
+                            completed = True
+                            break
+                        finally:
+                            _current.reset(token)
+                        yield chunk
+                finally:
+                    self.finish(request, stats, time.perf_counter() - started, enforce=completed)
+        else:
+            def content(chunks):
+                chunks = iter(chunks)
+                completed = False
+                try:
+                    while True:
+                        token = _current.set(stats)
+                        try:
+                            chunk = next(chunks)
+                        except StopIteration:
+                            completed = True
+                            break
+                        finally:
+                            _current.reset(token)
+                        yield chunk
+                finally:
+                    self.finish(request, stats, time.perf_counter() - started, enforce=completed)
+        response.streaming_content = content(response.streaming_content)
+        return response
+
+    def finish(self, request, stats, wall_time, enforce=True):
+        match = getattr(request, 'resolver_match', None)
+        view = (match and match.view_name) or UNRESOLVED
+        measured = {'queries': stats.queries, 'db_time': stats.db_time, 'time': wall_time}
+        exceeded = [
+            budget for budget, limit in view_budget(view).items()
+            if limit is not None and measured[budget] > limit
+        ]
+        registry.observe(view, stats, wall_time, exceeded)
+        if exceeded:
+            message = f"{request.method} {request.path} ({view}) exceeded its budget: " + ", ".join(
+                f"{measured[budget]:g} {BUDGETS[budget]} > {view_budget(view)[budget]:g}" for budget in exceeded
+            )
+            if enforce and getattr(settings, 'REQUEST_BUDGET_ACTION', 'log') == 'raise':
+                raise BudgetExceeded(message)
+            logger.warning(message)
+
+
+def metrics_view(request):
+    """Serves the request metrics in the Prometheus text format; staff only."""
+    if not (request.user.is_active and request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
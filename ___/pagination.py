@@ -0,0 +1,223 @@
+"""
+Keyset (seek) pagination for list views.
+
+Offset pagination makes the database walk past every earlier row, so deep pages get
+slower, and rows shift between pages when others are added. A keyset page instead
+starts right after the last row of the previous page, e.g. for ordering (name, id):
+
+    WHERE name > %s OR (name = %s AND id > %s) ORDER BY name, id LIMIT per_page + 1
+
+which an index on the ordering columns answers in the same time however deep the page.
+Pages are addressed by opaque cursors (?after=... or ?before=...) rather than numbers.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+from django.views.generic import View
+from django.views.generic.list import MultipleObjectMixin, MultipleObjectTemplateResponseMixin
+
+from . import cache
+
+
+def encode_cursor(values):
+    # Dates, decimals etc. become strings, which filter() accepts back for those fields
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidPage("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidPage("Invalid cursor")
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Pages through queryset in the order of ordering, a sequence of field names (with
+    '-' for descending) that together are unique, e.g. ('name', 'pk'). They must be
+    attributes of the rows, so order by an annotation to seek on a related field.
+    Every page costs one query for the rows, plus one per prefetch_related() lookup.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('name', 'pk')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+
+    def decode(self, cursor):
+        """
+        Returns the ordering values of a cursor of this paginator, or raises InvalidPage
+        if it isn't one (e.g. not a list of one scalar per ordering field).
+        """
+        values = decode_cursor(cursor)
+        if len(values) != len(self.ordering) or not all(
+            isinstance(value, (str, int, float)) for value in values
+        ):
+            raise InvalidPage("Invalid cursor")
+        return values
+
+    def cache_key(self, after=None, before=None):
+        """
+        Identifies a page by its cursors' decoded values, so the cache key never holds
+        the request's text and equivalent cursors share an entry. Raises InvalidPage
+        for invalid cursors.
+        """
+        values = [None if cursor is None else self.decode(cursor) for cursor in (after, before)]
+        return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+    def _seek(self, values, backwards=False):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND (b > y OR (b = y AND c > z)))
+        q = None
+        for field, value in reversed(list(zip(self.ordering, values))):
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            step = Q(**{f"{field}__{'lt' if descending != backwards else 'gt'}": value})
+            q = step if q is None else step | (Q(**{field: value}) & q)
+        return q
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, field.lstrip('-')) for field in self.ordering])
+
+    def _page_queryset(self, after, before):
+        queryset = self.queryset
+        if before is not None:
+            queryset = queryset.filter(self._seek(self.decode(before), backwards=True)).order_by(
+                *(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering)
+            )
+        else:
+            if after is not None:
+                queryset = queryset.filter(self._seek(self.decode(after)))
+            queryset = queryset.order_by(*self.ordering)
+        return queryset[:self.per_page + 1]
+
+    def _make_page(self, rows, after, before):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before is not None:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if has_next and rows else None,
+            previous_cursor=self._cursor(rows[0]) if has_previous and rows else None,
+        )
+
+    def page(self, after=None, before=None):
+        """Returns the page following the after cursor, the one preceding before, or the first."""
+        return self._make_page(list(self._page_queryset(after, before)), after, before)
+
+    async def apage(self, after=None, before=None):
+        """Async version of page()."""
+        return self._make_page([row async for row in self._page_queryset(after, before)], after, before)
+
+
+class KeysetPaginationMixin:
+    """
+    Keyset pagination for a ListView, on the model's ordering plus the primary key. Set
+    paginate_by to enable it; the context then has page_obj.next_cursor/previous_cursor
+    for the ?after= and ?before= links. If cache_namespace is set, each page is cached
+    in it (see ___.cache).
+    """
+    cache_namespace = None
+
+    def get_keyset_ordering(self):
+        return [*(self.ordering or self.model._meta.ordering), 'pk']
+
+    def get_keyset_paginator(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering())
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+        cache_key = None
+        if self.cache_namespace:
+            try:
+                cache_key = [self.model._meta.label_lower, page_size, paginator.cache_key(after, before)]
+            except InvalidPage as e:
+                raise Http404(str(e))
+        return paginator, after, before, cache_key
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, after, before, cache_key = self.get_keyset_paginator(queryset, page_size)
+
+        def get_page():
+            try:
+                return paginator.page(after=after, before=before)
+            except InvalidPage as e:
+                raise Http404(str(e))
+
+        if self.cache_namespace:
+            page = cache.cached(self.cache_namespace, cache_key, get_page)
+        else:
+            page = get_page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class AsyncKeysetListView(KeysetPaginationMixin, MultipleObjectTemplateResponseMixin, MultipleObjectMixin, View):
+    """
+    An async ListView with keyset pagination: the page is fetched with the async ORM
+    (and the async cache API), so the request never leaves the event loop until the
+    template is rendered. The context is the same as KeysetPaginationMixin's.
+    """
+
+    async def apaginate_queryset(self, queryset, page_size):
+        paginator, after, before, cache_key = self.get_keyset_paginator(queryset, page_size)
+
+        async def get_page():
+            try:
+                return await paginator.apage(after=after, before=before)
+            except InvalidPage as e:
+                raise Http404(str(e))
+
+        if self.cache_namespace:
+            page = await cache.acached(self.cache_namespace, cache_key, get_page)
+        else:
+            page = await get_page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        paginator, page, object_list, is_paginated = await self.apaginate_queryset(queryset, self.get_paginate_by(queryset))
+        self.object_list = object_list
+        context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            'view': self,
+        }
+        context_object_name = self.get_context_object_name(queryset)
+        if context_object_name is not None:
+            context[context_object_name] = object_list
+        return self.render_to_response(context)
@@ -48,7 +48,6 @@ INSTALLED_APPS += [
     "allauth.account",
     "crispy_forms",
     "crispy_bootstrap5",
-    "debug_toolbar",
     "nested_admin",
 ]
 
@@ -65,9 +64,9 @@ INSTALLED_APPS += [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware', # WhiteNoise
+    "___.metrics.RequestMetricsMiddleware",  # Per-view query/time metrics and budgets
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",  # Django Debug Toolbar
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -116,16 +115,45 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-## Redis cache
-#CACHES = {
-#        "default": {  
-#            "BACKEND": "django_redis.cache.RedisCache",
-#            "LOCATION": config('CACHELOCATION'),
-#            "OPTIONS": {
-#                "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#        },
-#    }
-#}
+# Cache
+# https://docs.djangoproject.com/en/dev/topics/cache/
+# Uses Redis when CACHELOCATION is set (e.g. redis://localhost:6379/0),
+# and a per-process local-memory cache otherwise (local development, tests).
+CACHELOCATION = config('CACHELOCATION', default='')
+if CACHELOCATION:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": CACHELOCATION,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Request budgets
+# Most queries, database seconds and wall seconds per request, by URL name with a default
+# for the rest (see ___.metrics). Over-budget requests are logged; tests fail on the
+# query budgets only (see ___.test_runner).
+REQUEST_BUDGETS = {
+    "default": {"queries": 50, "db_time": 0.5, "time": 2.0},
+    "vehicle_list": {"queries": 6},
+    "member_list": {"queries": 6},
+    "member_detail": {"queries": 6},
+    "vehicle_odometer_timeline": {"queries": 6},
+    "monthly_log_summary": {"queries": 8},
+    "member_miles_report": {"queries": 6},
+    # Constant whatever the number of rows on the sheet
+    "admin:mileage_logs_monthlymileagelog_grid": {"queries": 25},
+}
+REQUEST_BUDGET_ACTION = config("REQUEST_BUDGET_ACTION", default="log")
+TEST_RUNNER = "___.test_runner.TestRunner"
 
 # Internationalization
 # https://docs.djangoproject.com/en/dev/topics/i18n/
@@ -1,5 +1,9 @@
 from .base import *
 
+# Django Debug Toolbar, for local development only
+INSTALLED_APPS += ["debug_toolbar"]
+MIDDLEWARE.insert(MIDDLEWARE.index("django.middleware.common.CommonMiddleware") + 1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 if 'CODESPACE_NAME' in os.environ:
     codespace_name = config("CODESPACE_NAME")
     codespace_domain = config("GITHUB_CODESPACES_PORT_FORWARDING_DOMAIN")
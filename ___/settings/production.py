@@ -1,5 +1,12 @@
 from .base import *
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+# Cache versions (and with them the member resolver) are shared between worker processes
+# only through Redis; with the local-memory fallback, each worker would keep serving what
+# it cached before another worker's writes.
+if not CACHELOCATION and config('WEB_CONCURRENCY', default=1, cast=int) > 1:
+    raise ImproperlyConfigured("Set CACHELOCATION to a Redis URL, or WEB_CONCURRENCY to 1.")
 
 # Create CSRF_TRUSTED_ORIGINS env variable with onrender.com domain name
 CSRF_TRUSTED_ORIGINS = [config('CSRF_TRUSTED_ORIGINS')]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def test_budgets():
+    """
+    Returns an override_settings() that makes over-budget requests fail with
+    BudgetExceeded, with only the query budgets of REQUEST_BUDGETS: time and database
+    time budgets would fail tests at random on a slow or loaded machine.
+    """
+    budgets = getattr(settings, 'REQUEST_BUDGETS', {})
+    return override_settings(
+        REQUEST_BUDGET_ACTION='raise',
+        REQUEST_BUDGETS={
+            view: {budget: limit for budget, limit in limits.items() if budget == 'queries'}
+            for view, limits in budgets.items()
+        },
+    )
+
+
+test_budgets.__test__ = False  # A helper, not a test, for pytest
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the tests with the request query budgets enforced (see test_budgets())."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budgets = test_budgets()
+        self._budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._budgets.disable()
+        super().teardown_test_environment(**kwargs)
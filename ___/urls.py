@@ -20,6 +20,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 admin.site.site_title = "Dancing Rabbit Vehicle Co-op"
 admin.site.site_header = "DRVC administration"
 admin.site.index_title = "DRVC administration"
@@ -30,14 +32,17 @@ urlpatterns = [
     path("accounts/", include("allauth.urls")),
     path("", include("pages.urls")),
     path("vehicles/", include("vehicles.urls")),
-    path("members/", include("members.urls"))
+    path("members/", include("members.urls")),
+    path("mileage-logs/", include("mileage_logs.urls")),
+    path("metrics/", metrics_view, name="metrics"),
 ]
 if settings.DEBUG:
-    import debug_toolbar
-
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    import debug_toolbar
+
     urlpatterns = [
         path("__debug__/", include(debug_toolbar.urls)),
     ] + urlpatterns
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _request_budgets(django_test_environment):
+    """Enforces the request query budgets under pytest, as ___.test_runner does under manage.py test."""
+    from ___.test_runner import test_budgets
+
+    with test_budgets():
+        yield
@@ -0,0 +1,75 @@
+import re
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+from .models import Member
+from .resolver import resolver
+
+
+class MemberNameField(forms.CharField):
+    """
+    A text field that accepts a member's name or any of their aliases, matched case- and
+    whitespace-insensitively, and cleans to the Member.
+    """
+    default_error_messages = {
+        'unknown_member': _('No member is called "%(name)s".'),
+    }
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+        member_id = resolver.resolve(value)
+        if member_id is None:
+            raise ValidationError(self.error_messages['unknown_member'], code='unknown_member', params={'name': value})
+        return Member.objects.get(pk=member_id)
+
+
+class MemberSeatsField(forms.CharField):
+    """
+    A text field for the riders of a trip as written on a paper log: comma- or
+    semicolon-separated names or aliases, each optionally followed by ":" and a number
+    of seats, e.g. "Alice:2, B. Smith". Cleans to a list of (member id, seats) pairs,
+    or None if blank; members are resolved in memory, without a query.
+    """
+    default_error_messages = {
+        'unknown_member': _('No member is called "%(name)s".'),
+        'unknown_member_suggestions': _('No member is called "%(name)s"; did you mean %(suggestions)s?'),
+        'invalid_seats': _('"%(seats)s" is not a number of seats for %(name)s.'),
+        'duplicate_member': _('%(name)s is listed more than once.'),
+    }
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+        codes = []
+        for code in re.split(r'[,;]', value):
+            name, _colon, seats = code.partition(':')
+            if name.strip():
+                codes.append((name.strip(), seats.strip() or '1'))
+
+        resolved = resolver.resolve_many(name for name, seats in codes)
+        errors, claims = [], []
+        for name, seats in codes:
+            member_id = resolved[name]
+            if member_id is None:
+                suggestions = [s['member_name'] for s in resolver.suggest(name, limit=3)]
+                if suggestions:
+                    errors.append(ValidationError(
+                        self.error_messages['unknown_member_suggestions'], code='unknown_member',
+                        params={'name': name, 'suggestions': ' or '.join(f'"{s}"' for s in suggestions)},
+                    ))
+                else:
+                    errors.append(ValidationError(self.error_messages['unknown_member'], code='unknown_member', params={'name': name}))
+            elif not seats.isdigit() or int(seats) < 1:
+                errors.append(ValidationError(self.error_messages['invalid_seats'], code='invalid_seats', params={'seats': seats, 'name': name}))
+            elif member_id in dict(claims):
+                errors.append(ValidationError(self.error_messages['duplicate_member'], code='duplicate_member', params={'name': name}))
+            else:
+                claims.append((member_id, int(seats)))
+        if errors:
+            raise ValidationError(errors)
+        return claims
@@ -0,0 +1,72 @@
+"""
+Fuzzy matching of misspelled or abbreviated member names from handwritten trip sheets.
+
+Candidates are ranked by trigram similarity to Member.name and MemberAlias.name. On
+PostgreSQL the pg_trgm extension does the work, using the GIN trigram indexes created by
+members migration 0008; on other databases the in-process trigram index kept by
+members.resolver is used. Both score names the same way, so results agree.
+
+A match someone has confirmed can be saved with save_alias(), after which the name
+resolves exactly (see members.resolver).
+"""
+from django.db import connection, transaction
+from django.db.models import F, Value
+
+from .models import Member, MemberAlias
+from .resolver import resolver
+
+DEFAULT_LIMIT = 5
+# pg_trgm's default similarity_threshold
+DEFAULT_MIN_SCORE = 0.3
+
+
+def _suggest_postgres(name, limit, min_score):
+    # Imported here since django.contrib.postgres needs psycopg
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    best = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        # The % operator, which the GIN indexes answer, matches from the server's
+        # pg_trgm.similarity_threshold: set it to min_score for this transaction only
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(min_score)])
+        names = Member.objects.filter(TrigramSimilar(F('name'), Value(name))).annotate(
+            score=TrigramSimilarity('name', name),
+        ).order_by('-score', 'name').values_list('pk', 'name', 'name', 'score')[:limit]
+        aliases = MemberAlias.objects.filter(TrigramSimilar(F('name'), Value(name))).annotate(
+            score=TrigramSimilarity('name', name),
+        ).order_by('-score', 'name').values_list('member_id', 'member__name', 'name', 'score')
+        for member_id, member_name, matched_name, score in [*names, *aliases]:
+            if score > best.get(member_id, {'score': 0})['score']:
+                best[member_id] = {'member_id': member_id, 'member_name': member_name, 'matched_name': matched_name, 'score': score}
+    return sorted(best.values(), key=lambda candidate: (-candidate['score'], candidate['member_name']))[:limit]
+
+
+def suggest_members(name, limit=DEFAULT_LIMIT, min_score=DEFAULT_MIN_SCORE):
+    """
+    Returns up to limit candidate members for name, best first, as dicts of
+    member_id, member_name, matched_name (the name or alias that matched) and score
+    (0 to 1). A name that resolves exactly is returned alone with a score of 1.
+    """
+    member_id = resolver.resolve(name)
+    if member_id is not None:
+        return [{'member_id': member_id, 'member_name': resolver.names()[member_id], 'matched_name': name, 'score': 1.0}]
+    if connection.vendor == 'postgresql':
+        return _suggest_postgres(name, limit, min_score)
+    return resolver.suggest(name, limit, min_score)
+
+
+def save_alias(name, member):
+    """
+    Records a confirmed match of name to member as a MemberAlias, so that the name
+    resolves exactly from now on. Returns the new alias, or None if name already
+    resolves to member. Raises ValidationError if the alias can't be saved, e.g.
+    because it is already another member's alias.
+    """
+    name = ' '.join(name.split())
+    if resolver.resolve(name) == member.pk:
+        return None
+    alias = MemberAlias(name=name, member=member)
+    alias.full_clean()
+    alias.save()
+    return alias
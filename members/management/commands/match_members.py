@@ -0,0 +1,45 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from members.fuzzy import DEFAULT_LIMIT, DEFAULT_MIN_SCORE, save_alias, suggest_members
+from members.models import Member
+
+
+class Command(BaseCommand):
+    help = "Suggests the members that misspelled or abbreviated names most likely refer to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='+', help="Names as written on the trip sheets")
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help="Candidates to list per name")
+        parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE, help="Lowest similarity (0-1) to list")
+        parser.add_argument(
+            '--save-as', type=int, metavar='MEMBER_ID',
+            help="Save the given names as aliases of this member once the match is confirmed",
+        )
+
+    def handle(self, *args, **options):
+        if options['save_as'] is not None:
+            try:
+                member = Member.objects.get(pk=options['save_as'])
+            except Member.DoesNotExist:
+                raise CommandError(f"No member with id {options['save_as']}")
+            for name in options['names']:
+                try:
+                    alias = save_alias(name, member)
+                except ValidationError as e:
+                    raise CommandError(f"Could not save {name!r}: {'; '.join(e.messages)}")
+                if alias is None:
+                    self.stdout.write(f"{name!r} already refers to {member.name}.")
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"Saved {alias.name!r} as an alias of {member.name}."))
+            return
+
+        for name in options['names']:
+            candidates = suggest_members(name, options['limit'], options['min_score'])
+            if not candidates:
+                self.stdout.write(f"{name}: no likely members")
+                continue
+            self.stdout.write(f"{name}:")
+            for candidate in candidates:
+                matched = '' if candidate['matched_name'] == candidate['member_name'] else f" (as {candidate['matched_name']!r})"
+                self.stdout.write(f"  {candidate['score']:.2f}  {candidate['member_name']} [{candidate['member_id']}]{matched}")
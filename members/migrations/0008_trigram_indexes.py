@@ -0,0 +1,33 @@
+from django.db import migrations
+
+INDEXES = [
+    ('members_member_name_trgm', 'members_member'),
+    ('members_memberalias_name_trgm', 'members_memberalias'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Only PostgreSQL has pg_trgm; elsewhere members.fuzzy uses an in-process index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index, table in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index, table in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0007_alter_member_options_alter_memberalias_options_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,143 @@
+"""
+In-memory resolution of member names and aliases.
+
+Paper logs spell riders' names inconsistently, which is what MemberAlias is for.
+MemberResolver loads every Member.name and MemberAlias.name once into a dict keyed by
+a normalized form of the name (case-folded, with whitespace collapsed), so resolving a
+name is a dict lookup rather than two queries. The same load also builds the trigram
+index that members.fuzzy uses to suggest members for misspelled names.
+
+The index is rebuilt lazily when the "members" cache namespace version changes, which
+happens when a transaction that saved or deleted a Member or MemberAlias commits, in any
+process (see members.signals and ___.cache). Changes aren't visible to the resolver
+before they commit, so a rolled-back change never is. Processes only see each other's
+changes through a shared cache (Redis), not the local-memory fallback.
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+
+from ___ import cache
+from .models import Member, MemberAlias
+
+_WHITESPACE = re.compile(r'\s+')
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize_name(name):
+    """Case-folds a name and collapses runs of whitespace, e.g. "  Mary  ANN " -> "mary ann"."""
+    return _WHITESPACE.sub(' ', str(name)).strip().casefold()
+
+
+def trigrams(name):
+    """
+    Returns the set of trigrams of a name the way pg_trgm computes them: each word is
+    lower-cased, padded with two spaces in front and one behind, and cut into
+    three-character pieces ("Bob" -> "  b", " bo", "bob", "ob ").
+    """
+    grams = set()
+    for word in _WORD.findall(str(name).casefold()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _Index:
+    def __init__(self):
+        self.exact = {}
+        # One (name, member id, trigram count) per Member.name and MemberAlias.name
+        self.names = []
+        self.member_names = {}
+        self.postings = defaultdict(list)
+
+    def add_name(self, name, member_id):
+        grams = trigrams(name)
+        position = len(self.names)
+        self.names.append((name, member_id, len(grams)))
+        for gram in grams:
+            self.postings[gram].append(position)
+
+
+class MemberResolver:
+    """
+    Maps (normalized) member names and aliases to Member ids.
+
+    A member's own name wins over another member's alias with the same normalized form;
+    aliases that normalize to the same text for different members are ambiguous and
+    resolve to None.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = _Index()
+        self._version = None
+
+    def _build(self):
+        index = _Index()
+        ambiguous = set()
+        for name, member_id in MemberAlias.objects.order_by().values_list('name', 'member_id').iterator():
+            key = normalize_name(name)
+            if index.exact.setdefault(key, member_id) != member_id:
+                ambiguous.add(key)
+            index.add_name(name, member_id)
+        for key in ambiguous:
+            index.exact[key] = None
+        for name, member_id in Member.objects.order_by().values_list('name', 'pk').iterator():
+            index.exact[normalize_name(name)] = member_id
+            index.member_names[member_id] = name
+            index.add_name(name, member_id)
+        return index
+
+    def _current(self):
+        version = cache.namespace_version(cache.MEMBERS)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._index = self._build()
+                    self._version = version
+        return self._index
+
+    def index(self):
+        """Returns the current name -> member id index, rebuilding it first if members have changed."""
+        return self._current().exact
+
+    def names(self):
+        """Returns the current member id -> Member.name map."""
+        return self._current().member_names
+
+    def clear(self):
+        self._version = None
+
+    def resolve(self, name):
+        """Returns the id of the member with this name or alias, or None."""
+        return self.index().get(normalize_name(name))
+
+    def resolve_many(self, names):
+        """Resolves many names at once; returns a dict of name -> member id (or None)."""
+        index = self.index()
+        return {name: index.get(normalize_name(name)) for name in names}
+
+    def suggest(self, name, limit=5, min_score=0.3):
+        """
+        Ranks members by the trigram similarity (shared / combined trigrams, as pg_trgm's
+        similarity()) of name to their name or best-matching alias. Only names sharing
+        at least one trigram with name are scored, found through the inverted index.
+        Returns up to limit dicts (member_id, member_name, matched_name, score), best first.
+        """
+        index = self._current()
+        grams = trigrams(name)
+        shared = Counter(position for gram in grams for position in index.postings.get(gram, ()))
+        best = {}
+        for position, count in shared.items():
+            matched_name, member_id, size = index.names[position]
+            score = count / (len(grams) + size - count)
+            if score >= min_score and score > best.get(member_id, (0, None))[0]:
+                best[member_id] = (score, matched_name)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], index.member_names[item[0]]))
+        return [
+            {'member_id': member_id, 'member_name': index.member_names[member_id], 'matched_name': matched_name, 'score': score}
+            for member_id, (score, matched_name) in ranked[:limit]
+        ]
+
+
+resolver = MemberResolver()
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ___ import cache
+from .models import Member, MemberAlias
+
+
+@receiver(post_save, sender=MemberAlias)
+@receiver(post_delete, sender=MemberAlias)
+def invalidate_member_caches(sender, using, **kwargs):
+    # On commit only: an index rebuilt from this transaction's uncommitted rows would
+    # outlive a rollback. The version bump makes every process's resolver rebuild.
+    cache.invalidate_on_commit(cache.MEMBERS, cache.REPORTS, using=using)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def invalidate_member_name_caches(sender, using, **kwargs):
+    # Monthly log summaries (cached under MILEAGE_LOGS) list members by name
+    cache.invalidate_on_commit(cache.MEMBERS, cache.REPORTS, cache.MILEAGE_LOGS, using=using)
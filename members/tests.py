@@ -1,3 +1,201 @@
+import datetime
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
 from django.test import TestCase
+from django.urls import reverse
+
+from ___ import cache
+from mileage_logs.ingest import bulk_ingest_entries
+from mileage_logs.models import MonthlyMileageLog, MileageLogEntry
+from vehicles.models import Vehicle
+from .forms import MemberNameField, MemberSeatsField
+from .fuzzy import _suggest_postgres, save_alias, suggest_members
+from .models import Member, MemberAlias
+from .resolver import normalize_name, resolver, trigrams
+
+
+class MemberResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Member.objects.create(name="Alice Smith", email="alice@example.com")
+        cls.bob = Member.objects.create(name="Bob", email="bob@example.com")
+        MemberAlias.objects.create(name="Ally", member=cls.alice)
+
+    def setUp(self):
+        cache.cache.clear()
+        resolver.clear()
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Mary \t ANN "), "mary ann")
+
+    def test_resolves_names_and_aliases_without_queries(self):
+        resolver.index()
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve("alice  smith"), self.alice.pk)
+            self.assertEqual(resolver.resolve(" ALLY"), self.alice.pk)
+            self.assertIsNone(resolver.resolve("Carol"))
+            self.assertEqual(
+                resolver.resolve_many(["bob", "Ally", "nobody"]),
+                {"bob": self.bob.pk, "Ally": self.alice.pk, "nobody": None},
+            )
+
+    def test_member_name_wins_over_alias_and_duplicate_aliases_are_ambiguous(self):
+        MemberAlias.objects.create(name="bob", member=self.alice)
+        MemberAlias.objects.create(name="Smithy", member=self.alice)
+        MemberAlias.objects.create(name="SMITHY ", member=self.bob)
+        self.assertEqual(resolver.resolve("Bob"), self.bob.pk)
+        self.assertIsNone(resolver.resolve("smithy"))
+
+    def test_refreshes_when_aliases_change(self):
+        self.assertIsNone(resolver.resolve("Bobby"))
+        with self.captureOnCommitCallbacks(execute=True):
+            alias = MemberAlias.objects.create(name="Bobby", member=self.bob)
+        self.assertEqual(resolver.resolve("bobby"), self.bob.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            alias.delete()
+        self.assertIsNone(resolver.resolve("bobby"))
+
+    def test_uncommitted_changes_are_never_resolved(self):
+        resolver.index()
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            MemberAlias.objects.create(name="Ghost", member=self.bob)
+            self.assertIsNone(resolver.resolve("ghost"))
+            raise DatabaseError("rolled back")
+        self.assertIsNone(resolver.resolve("ghost"))
+
+    def test_member_name_field(self):
+        field = MemberNameField()
+        self.assertEqual(field.clean(" ally "), self.alice)
+        with self.assertRaisesMessage(Exception, 'No member is called "Carol".'):
+            field.clean("Carol")
+
+    def test_member_seats_field(self):
+        field = MemberSeatsField(required=False)
+        self.assertEqual(field.clean("ally:2; BOB"), [(self.alice.pk, 2), (self.bob.pk, 1)])
+        self.assertIsNone(field.clean(""))
+        with self.assertRaises(ValidationError) as ctx:
+            field.clean("Bob, bob:3, Carol")
+        self.assertEqual(ctx.exception.messages, ['bob is listed more than once.', 'No member is called "Carol".'])
+
+
+class FuzzyMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jonathan = Member.objects.create(name="Jonathan Smith", email="jon@example.com")
+        cls.joan = Member.objects.create(name="Joan Smithers", email="joan@example.com")
+        cls.mary = Member.objects.create(name="Mary Ann Lee", email="mary@example.com")
+        MemberAlias.objects.create(name="Jonny", member=cls.jonathan)
+
+    def setUp(self):
+        cache.cache.clear()
+        resolver.clear()
+
+    def test_trigrams_match_pg_trgm(self):
+        self.assertEqual(trigrams("Bob"), {"  b", " bo", "bob", "ob "})
+        self.assertEqual(trigrams("a-b"), {"  a", " a ", "  b", " b "})
+
+    def test_suggests_ranked_candidates(self):
+        candidates = suggest_members("Jonathon Smth")
+        self.assertEqual(candidates[0]['member_id'], self.jonathan.pk)
+        self.assertEqual([c['score'] for c in candidates], sorted((c['score'] for c in candidates), reverse=True))
+        self.assertNotIn(self.mary.pk, [c['member_id'] for c in candidates])
+
+    def test_matches_aliases(self):
+        candidates = suggest_members("Jonnie")
+        self.assertEqual(candidates[0]['member_id'], self.jonathan.pk)
+        self.assertEqual(candidates[0]['matched_name'], "Jonny")
+
+    def test_exact_match_scores_one(self):
+        self.assertEqual(suggest_members("mary ann lee")[0]['score'], 1.0)
+
+    @skipUnless(connection.vendor == 'postgresql', "Needs pg_trgm")
+    def test_postgres_path_honours_min_score(self):
+        for min_score in (0.1, 0.3):
+            self.assertEqual(
+                [(c['member_id'], c['matched_name']) for c in _suggest_postgres("Jonathon Smth", 5, min_score)],
+                [(c['member_id'], c['matched_name']) for c in resolver.suggest("Jonathon Smth", 5, min_score)],
+            )
+        # Below pg_trgm's default similarity_threshold
+        self.assertIn(self.joan.pk, [c['member_id'] for c in _suggest_postgres("Jonathon Smth", 5, 0.1)])
+
+    def test_exact_match_needs_no_query(self):
+        resolver.index()
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest_members("jonny")[0]['member_name'], "Jonathan Smith")
+
+    def test_save_alias(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            alias = save_alias("  J.  Smith ", self.jonathan)
+        self.assertEqual(alias.name, "J. Smith")
+        self.assertEqual(resolver.resolve("j. smith"), self.jonathan.pk)
+        self.assertIsNone(save_alias("jonny", self.jonathan))
+        with self.assertRaises(ValidationError):
+            save_alias("Jonny", self.joan)
+
+
+class MemberListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        members = Member.objects.bulk_create([
+            Member(name=f"Member {i:02d}", email=f"member{i}@example.com") for i in range(60)
+        ])
+        MemberAlias.objects.bulk_create([MemberAlias(name=f"M{i}", member=member) for i, member in enumerate(members)])
+
+    def setUp(self):
+        cache.cache.clear()
+
+    def test_pages_cost_a_fixed_number_of_queries(self):
+        # One query for the page of members, one for their aliases
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('member_list'))
+        self.assertContains(response, "Member 49")
+        self.assertNotContains(response, "Member 50")
+        self.assertContains(response, "M49")
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('member_list'), {'after': response.context['page_obj'].next_cursor})
+        self.assertContains(response, "Member 59")
+        self.assertFalse(response.context['page_obj'].has_next())
+
+
+class MemberTripHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        log = MonthlyMileageLog.objects.create(
+            vehicle=vehicle, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.alice = Member.objects.create(name="Alice", email="alice@example.com")
+            Member.objects.create(name="Bob", email="bob@example.com")
+        # Two trips a day, so entry_date alone doesn't order them
+        bulk_ingest_entries([
+            {'monthly_log': log.pk, 'entry_date': datetime.date(2024, 5, 1 + i // 2),
+             'start_mileage': 1000 + i * 30, 'end_mileage': 1030 + i * 30,
+             'claims': [{'member': "Alice", 'seats': 2}, {'member': "Bob"}]}
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        cache.cache.clear()
+
+    def test_trips_are_paged_newest_first_in_a_fixed_number_of_queries(self):
+        url = self.alice.get_absolute_url()
+        expected = list(MileageLogEntry.objects.order_by('-entry_date', '-pk').values_list('pk', flat=True))
+        # The member, then one page of their trips with vehicles and seat totals
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        trips = response.context['trips']
+        self.assertEqual(len(trips), 25)
+        self.assertEqual(trips.object_list[0].share, Decimal(20))
+        self.assertEqual(trips.object_list[0].total_seats, 3)
+        self.assertContains(response, "2 of 3")
 
-# Create your tests here.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'after': trips.next_cursor})
+        self.assertEqual(
+            [claim.mileage_log_entry_id for claim in [*trips, *response.context['trips']]], expected,
+        )
+        self.assertFalse(response.context['trips'].has_next())
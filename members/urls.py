@@ -2,6 +2,6 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.MemberListView.as_view(), name="member_list"),
-    path("<int:pk>/", views.MemberDetailView.as_view(), name="member_detail")
+    path('', views.AsyncMemberListView.as_view(), name="member_list"),
+    path("<int:pk>/", views.AsyncMemberDetailView.as_view(), name="member_detail")
 ]
\ No newline at end of file
@@ -1,12 +1,71 @@
-from django.shortcuts import render
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, render
+from django.template.response import TemplateResponse
 from django.views import generic
+
+from ___ import cache
+from ___.pagination import AsyncKeysetListView, KeysetPaginationMixin, KeysetPaginator
+from mileage_logs.allocation import member_trips, seat_share
 from .models import Member
 
 # Create your views here.
-class MemberListView(generic.ListView):
+class MemberListMixin:
     model = Member
     template_name = "members/member_list.html"
+    paginate_by = 50
+    # Each page is invalidated whenever a member or alias changes; see members.signals
+    cache_namespace = cache.MEMBERS
+
+    def get_queryset(self):
+        return super().get_queryset().only('name', 'email').prefetch_related('aliases')
+
+
+class AsyncMemberListView(MemberListMixin, AsyncKeysetListView):
+    pass
+
+
+class MemberListView(MemberListMixin, KeysetPaginationMixin, generic.ListView):
+    """The synchronous equivalent of AsyncMemberListView, kept for the loadtest command."""
+
+
+class MemberTripsMixin:
+    template_name = "members/detail.html"
+    trips_per_page = 25
 
-class MemberDetailView(generic.DetailView):
+    def get_trips_paginator(self, member):
+        # Most recent trips first, paged by (entry_date, entry id) so old pages stay cheap
+        return KeysetPaginator(member_trips(member), self.trips_per_page, ('-entry_date', '-mileage_log_entry_id'))
+
+    def get_page_cursors(self):
+        return {'after': self.request.GET.get('after'), 'before': self.request.GET.get('before')}
+
+    def add_shares(self, trips):
+        for claim in trips:
+            claim.share = seat_share(claim.mileage_log_entry.distance_traveled, claim.number_of_seats_claimed, claim.total_seats)
+        return trips
+
+
+class AsyncMemberDetailView(MemberTripsMixin, generic.View):
+    async def get(self, request, pk):
+        member = await aget_object_or_404(Member.objects.only('name', 'email'), pk=pk)
+        try:
+            trips = await self.get_trips_paginator(member).apage(**self.get_page_cursors())
+        except InvalidPage as e:
+            raise Http404(str(e))
+        context = {'view': self, 'object': member, 'member': member, 'trips': self.add_shares(trips)}
+        return TemplateResponse(request, self.template_name, context)
+
+
+class MemberDetailView(MemberTripsMixin, generic.DetailView):
+    """The synchronous equivalent of AsyncMemberDetailView, kept for the loadtest command."""
     model = Member
-    template_name = "members/detail.html"
\ No newline at end of file
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            trips = self.get_trips_paginator(self.object).page(**self.get_page_cursors())
+        except InvalidPage as e:
+            raise Http404(str(e))
+        context['trips'] = self.add_shares(trips)
+        return context
@@ -1,22 +1,51 @@
-from django.contrib import admin
-from django.db import models
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Concat
 from django.forms import Textarea, TextInput
+from django.http import Http404, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.http import urlencode
 
 
 # Import Nested classes from django-nested-admin
 import nested_admin
 
+from members.resolver import resolver
+
 # Import all models from the mileage_logs app
-from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim
+from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim, MemberMonthlyUsage
+from .aggregates import GroupConcat
+from .continuity import month_boundary_breaks
+from .exports import csv_response, xlsx_response
+from .forms import EntryGridFormSet, MileageLogEntryInlineFormSet
+from .ingest import bulk_ingest_entries
+from .recompute import lock_monthly_logs
 # If you need to import Member, it's already used in MileageClaim, so it's implicitly there.
 # from members.models import Member # Not strictly needed if only for admin configuration in this file
 
+class MemberRawIdWidget(ForeignKeyRawIdWidget):
+    """A raw id widget that labels members from the member resolver's index rather than with a query each."""
+
+    def label_and_url_for_value(self, value):
+        try:
+            name = resolver.names().get(int(value))
+        except (TypeError, ValueError):
+            name = None
+        if name is None:
+            return "", ""
+        return name, reverse(f'{self.admin_site.name}:members_member_change', args=(value,))
+
+
 # --- Inlines ---
 
 # Inline for MileageClaim within MileageLogEntry
 class MileageClaimInline(nested_admin.NestedTabularInline):
     model = MileageClaim
-    extra = 5
     fields = ('member', 'number_of_seats_claimed')
     raw_id_fields = ('member',) # Use raw_id_fields if you have many members
     verbose_name = "Member Seat Claim" # Custom verbose name for the inline header
@@ -25,9 +54,23 @@ class MileageClaimInline(nested_admin.NestedTabularInline):
         models.PositiveIntegerField: {'widget': TextInput(attrs={'size': '5'})},
     }
 
+    def get_extra(self, request, obj=None, **kwargs):
+        # One blank claim for a new entry; existing entries add claims on demand ("Add another")
+        return 0 if obj is not None and obj.pk else 1
+
+    def get_queryset(self, request):
+        # Each row's __str__ shows the member and the entry's date
+        return super().get_queryset(request).select_related('member', 'mileage_log_entry')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'member':
+            kwargs['widget'] = MemberRawIdWidget(db_field.remote_field, self.admin_site)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 # Inline for MileageLogEntry within MonthlyMileageLog
 class MileageLogEntryInline(nested_admin.NestedTabularInline): # StackedInline gives more space, better for nested inlines
     model = MileageLogEntry
+    formset = MileageLogEntryInlineFormSet # Validates odometer continuity across all rows at once
     extra = 1
     fields = ('entry_date',
                ('start_mileage', 'end_mileage'),
@@ -41,6 +84,8 @@ class MileageLogEntryInline(nested_admin.NestedTabularInline): # StackedInline g
     verbose_name = "Trip Entry"
     verbose_name_plural = "Trip Entries"
     ordering = ('entry_date', 'start_mileage')
+    # Entries are edited a page at a time; see MileageLogEntryInlineFormSet
+    per_page = 25
 
     # Nest the MileageClaimInline within this inline
     inlines = [MileageClaimInline]
@@ -50,6 +95,17 @@ class MileageLogEntryInline(nested_admin.NestedTabularInline): # StackedInline g
         models.DecimalField: {'widget': TextInput(attrs={'size': '10'})},
     }
 
+    def get_queryset(self, request):
+        # Each row's __str__ shows the vehicle's name
+        return super().get_queryset(request).select_related('monthly_log__vehicle')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.after = request.GET.get('entries_after')
+        formset.before = request.GET.get('entries_before')
+        return formset
+
 
 # --- ModelAdmin for each model ---
 
@@ -80,6 +136,102 @@ class MonthlyMileageLogAdmin(nested_admin.NestedModelAdmin):
         }),
     )
     readonly_fields = ('total_distance_logged',)
+    actions = ['export_entries_csv', 'export_entries_xlsx']
+
+    @admin.action(description="Export entries of selected logs (CSV)")
+    def export_entries_csv(self, request, queryset):
+        return csv_response(request, MileageLogEntry.objects.filter(monthly_log__in=queryset))
+
+    @admin.action(description="Export entries of selected logs (XLSX)")
+    def export_entries_xlsx(self, request, queryset):
+        return xlsx_response(request, MileageLogEntry.objects.filter(monthly_log__in=queryset))
+
+    def response_change(self, request, obj):
+        response = super().response_change(request, obj)
+        # "Save and continue editing" comes back to the same page of entries
+        cursors = {key: request.GET[key] for key in ('entries_after', 'entries_before') if key in request.GET}
+        if '_continue' in request.POST and cursors and response.status_code == 302:
+            separator = '&' if '?' in response['Location'] else '?'
+            response['Location'] += separator + urlencode(cursors)
+        return response
+
+    def get_urls(self):
+        return [
+            path(
+                'continuity/', self.admin_site.admin_view(self.continuity_view),
+                name='mileage_logs_monthlymileagelog_continuity',
+            ),
+            path(
+                '<path:object_id>/grid/', self.admin_site.admin_view(self.entry_grid_view),
+                name='mileage_logs_monthlymileagelog_grid',
+            ),
+        ] + super().get_urls()
+
+    def continuity_view(self, request):
+        """Lists every month boundary where a vehicle's log doesn't start at the previous log's end reading."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Month-to-month odometer continuity",
+            'breaks': month_boundary_breaks(),
+        }
+        return TemplateResponse(request, 'admin/mileage_logs/monthlymileagelog/continuity.html', context)
+
+    def entry_grid_view(self, request, object_id):
+        """
+        A spreadsheet-like sheet for transcribing a paper log's trips into a monthly log.
+        The sheet is validated as a whole (see EntryGridFormSet) and written with
+        bulk_ingest_entries(), in one transaction with set-based inserts, while the log
+        is locked.
+        """
+        log = self.get_object(request, unquote(object_id))
+        if log is None:
+            raise Http404(f"No monthly log with id {object_id!r}.")
+        if not self.has_change_permission(request, log):
+            raise PermissionDenied
+        try:
+            rows = min(max(int(request.GET.get('rows', EntryGridFormSet.extra)), 1), EntryGridFormSet.max_num)
+        except ValueError:
+            rows = EntryGridFormSet.extra
+
+        errors = []
+        if request.method == 'POST':
+            formset = EntryGridFormSet(request.POST, monthly_log=log, prefix='trips')
+            entries = None
+            try:
+                with transaction.atomic():
+                    # The sheet is checked against the log's entries, so keep other writers
+                    # to the log waiting until it's written (on databases with row locks)
+                    lock_monthly_logs([log.pk])
+                    if formset.is_valid():
+                        entries = bulk_ingest_entries(formset.rows())
+            except ValidationError as e:
+                # A member deleted since the sheet was validated, say
+                errors = e.messages
+            except IntegrityError:
+                errors = ["The sheet conflicts with trips saved meanwhile; nothing was written."]
+            if entries is not None:
+                self.message_user(request, f"Added {len(entries)} trips to {log}.", messages.SUCCESS)
+                if '_addanother' in request.POST:
+                    return HttpResponseRedirect(request.get_full_path())
+                return HttpResponseRedirect(reverse('admin:mileage_logs_monthlymileagelog_change', args=[log.pk]))
+        else:
+            formset = EntryGridFormSet(monthly_log=log, prefix='trips', extra=rows)
+
+        last_entry = log.log_entries.order_by('-entry_date', '-start_mileage').only('entry_date', 'end_mileage').first()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': log,
+            'title': f"Enter trips: {log}",
+            'formset': formset,
+            'errors': errors,
+            'last_entry': last_entry,
+            'more_rows': min(rows + 25, EntryGridFormSet.max_num),
+        }
+        return TemplateResponse(request, 'admin/mileage_logs/monthlymileagelog/grid.html', context)
 
 
 @admin.register(MileageLogEntry)
@@ -89,14 +241,51 @@ class MileageLogEntryAdmin(admin.ModelAdmin):
         'end_mileage', 'distance_traveled', 'get_members_with_seats',
         'get_total_claimed_seats',
     )
-    list_filter = ('monthly_log__vehicle', 'entry_date')
+    list_select_related = ('monthly_log__vehicle',) # monthly_log's __str__ uses the vehicle name
+    list_filter = ('vehicle', 'entry_date')
     search_fields = (
-        'description', 'monthly_log__vehicle__name',
+        'destination', 'purpose', 'monthly_log__vehicle__name',
         'monthly_log__vehicle__license_plate', 'mileageclaim__member__name'
     )
     date_hierarchy = 'entry_date'
     raw_id_fields = ('monthly_log',)
     readonly_fields = ('distance_traveled',)
+    actions = ['export_csv', 'export_xlsx']
+
+    def get_queryset(self, request):
+        # Annotate the claim columns so the changelist costs the same number of queries
+        # whatever the page size, instead of two claim queries per row.
+        claims = MileageClaim.objects.filter(mileage_log_entry=OuterRef('pk')).order_by().values('mileage_log_entry')
+        return super().get_queryset(request).annotate(
+            total_claimed_seats=Coalesce(
+                Subquery(claims.annotate(seats=Sum('number_of_seats_claimed')).values('seats')),
+                0,
+            ),
+            members_with_seats=Subquery(
+                claims.annotate(members=GroupConcat(Concat(
+                    'member__name', Value(' ('),
+                    Cast('number_of_seats_claimed', output_field=models.CharField()), Value(' seats)'),
+                    output_field=models.TextField(),
+                ))).values('members'),
+                output_field=models.TextField(),
+            ),
+        )
+
+    @admin.action(description="Export selected entries (CSV)")
+    def export_csv(self, request, queryset):
+        return csv_response(request, MileageLogEntry.objects.filter(pk__in=queryset.values('pk')))
+
+    @admin.action(description="Export selected entries (XLSX)")
+    def export_xlsx(self, request, queryset):
+        return xlsx_response(request, MileageLogEntry.objects.filter(pk__in=queryset.values('pk')))
+
+    @admin.display(description="Members & Seats")
+    def get_members_with_seats(self, obj):
+        return obj.members_with_seats or ""
+
+    @admin.display(description="Total claimed seats", ordering='total_claimed_seats')
+    def get_total_claimed_seats(self, obj):
+        return obj.total_claimed_seats
 
     inlines = [MileageClaimInline] # MileageClaims are still inlined here
 
@@ -110,6 +299,21 @@ class MileageLogEntryAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(MemberMonthlyUsage)
+class MemberMonthlyUsageAdmin(admin.ModelAdmin):
+    # Read-only: rows are maintained automatically from entries and claims
+    list_display = ('member', 'vehicle', 'year', 'month', 'trips', 'seat_miles', 'long_distance_miles', 'allocated_miles')
+    list_filter = ('vehicle', 'year', 'month')
+    search_fields = ('member__name',)
+    list_select_related = ('member', 'vehicle')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # @admin.register(MileageClaim)
 # class MileageClaimAdmin(admin.ModelAdmin):
 #     list_display = ('mileage_log_entry', 'member', 'number_of_seats_claimed', 'updated_at')
@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class GroupConcat(models.Aggregate):
+    """
+    Joins the values of a string expression with a delimiter, ordered by the values
+    themselves: STRING_AGG on Postgres, GROUP_CONCAT elsewhere (SQLite only orders the
+    values from version 3.44).
+    """
+    function = 'GROUP_CONCAT'
+    output_field = models.TextField()
+
+    def __init__(self, expression, delimiter=', ', **extra):
+        super().__init__(expression, models.Value(delimiter), **extra)
+
+    def _ordered_sql(self, function, compiler):
+        expression_sql, expression_params = compiler.compile(self.source_expressions[0])
+        delimiter_sql, delimiter_params = compiler.compile(self.source_expressions[1])
+        sql = f'{function}({expression_sql}, {delimiter_sql} ORDER BY {expression_sql})'
+        return sql, (*expression_params, *delimiter_params, *expression_params)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self._ordered_sql('STRING_AGG', compiler)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        if connection.Database.sqlite_version_info >= (3, 44):
+            return self._ordered_sql('GROUP_CONCAT', compiler)
+        return self.as_sql(compiler, connection, **extra_context)
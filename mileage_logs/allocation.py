@@ -0,0 +1,141 @@
+"""
+Seat-weighted allocation of trip distance to members.
+
+Each MileageLogEntry's distance_traveled is split between the members who claimed
+seats on it, in proportion to their MileageClaim.number_of_seats_claimed:
+
+    member's share = distance_traveled * seats claimed / total seats claimed on the trip
+
+All claims for the requested range are fetched in one query, with each trip's total
+seats computed by a window function, and the shares are summed in a single pass.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Window
+
+from .models import MileageClaim
+
+MILES = Decimal('0.01')
+
+
+def _month_range_filter(prefix, start, end):
+    q = Q()
+    if start is not None:
+        year, month = start
+        q &= Q(**{f'{prefix}year__gt': year}) | Q(**{f'{prefix}year': year, f'{prefix}month__gte': month})
+    if end is not None:
+        year, month = end
+        q &= Q(**{f'{prefix}year__lt': year}) | Q(**{f'{prefix}year': year, f'{prefix}month__lte': month})
+    return q
+
+
+def seat_share(distance, seats, total_seats):
+    """A member's share of a trip's distance for the seats they claimed."""
+    return (distance or 0) * seats / total_seats
+
+
+def member_trips(member):
+    """
+    Returns a queryset of the member's MileageClaims, with each trip's entry and vehicle
+    selected and annotated with entry_date and total_seats (the seats claimed on the trip
+    by everyone), ready to be ordered and paged by (entry_date, mileage_log_entry_id).
+    """
+    total_seats = MileageClaim.objects.filter(
+        mileage_log_entry=OuterRef('mileage_log_entry'),
+    ).order_by().values('mileage_log_entry').annotate(total=Sum('number_of_seats_claimed')).values('total')
+    return MileageClaim.objects.filter(member=member).select_related(
+        'mileage_log_entry__vehicle',
+    ).annotate(
+        entry_date=F('mileage_log_entry__entry_date'),
+        total_seats=Subquery(total_seats),
+    )
+
+
+def _claim_rows(start, end, vehicle):
+    claims = MileageClaim.objects.filter(
+        _month_range_filter('mileage_log_entry__', start, end)
+    )
+    if vehicle is not None:
+        claims = claims.filter(mileage_log_entry__vehicle=vehicle)
+
+    # values() rather than values_list(), whose aiterator() runs the query outside the sync thread
+    return claims.order_by().values(
+        'member_id', 'number_of_seats_claimed',
+        member_name=F('member__name'),
+        entry_id=F('mileage_log_entry_id'),
+        entry_date=F('mileage_log_entry__entry_date'),
+        distance=F('mileage_log_entry__distance_traveled'),
+        total_seats=Window(Sum('number_of_seats_claimed'), partition_by=[F('mileage_log_entry')]),
+    )
+
+
+def _trip_share(row):
+    distance, seats, total_seats = row['distance'], row['number_of_seats_claimed'], row['total_seats']
+    return {
+        'member_id': row['member_id'],
+        'member_name': row['member_name'],
+        'entry_id': row['entry_id'],
+        'entry_date': row['entry_date'],
+        'distance': distance or 0,
+        'seats': seats,
+        'total_seats': total_seats,
+        'share': seat_share(distance, seats, total_seats),
+    }
+
+
+def trip_shares(start=None, end=None, vehicle=None):
+    """
+    Yields one dict per MileageClaim in the range with the member's share of the trip.
+
+    start and end are inclusive (year, month) tuples; either may be None for an open range.
+    vehicle may be a Vehicle or a vehicle id.
+    """
+    for row in _claim_rows(start, end, vehicle).iterator(chunk_size=5000):
+        yield _trip_share(row)
+
+
+async def atrip_shares(start=None, end=None, vehicle=None):
+    """Async version of trip_shares()."""
+    async for row in _claim_rows(start, end, vehicle).aiterator(chunk_size=5000):
+        yield _trip_share(row)
+
+
+class _MemberTotals:
+    def __init__(self):
+        self.totals = defaultdict(lambda: {'trips': 0, 'seats': 0, 'miles': Decimal(0)})
+        self.names = {}
+
+    def add(self, share):
+        member = self.totals[share['member_id']]
+        member['trips'] += 1
+        member['seats'] += share['seats']
+        member['miles'] += share['share']
+        self.names[share['member_id']] = share['member_name']
+
+    def rows(self):
+        return [
+            {'member_id': member_id, 'member_name': self.names[member_id], **member, 'miles': member['miles'].quantize(MILES)}
+            for member_id, member in sorted(self.totals.items(), key=lambda item: self.names[item[0]])
+        ]
+
+
+def allocate_member_miles(start=None, end=None, vehicle=None):
+    """
+    Rolls the seat-weighted trip shares in the range up per member.
+
+    Returns a list of dicts (member_id, member_name, trips, seats, miles) ordered by
+    member name, with miles rounded to hundredths.
+    """
+    totals = _MemberTotals()
+    for share in trip_shares(start, end, vehicle):
+        totals.add(share)
+    return totals.rows()
+
+
+async def aallocate_member_miles(start=None, end=None, vehicle=None):
+    """Async version of allocate_member_miles()."""
+    totals = _MemberTotals()
+    async for share in atrip_shares(start, end, vehicle):
+        totals.add(share)
+    return totals.rows()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MileageLogsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mileage_logs"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,83 @@
+"""
+Fleet-wide checksum audit of MonthlyMileageLogs.
+
+MonthlyMileageLog.validate_checksum() checks one log with three queries and stops at
+the first mismatch. audit_monthly_logs() fetches every log together with its entries'
+total distance, first start and last end mileage in a single query, and reports every
+violation it finds.
+"""
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import MonthlyMileageLog, MileageLogEntry
+
+CHECKS = {
+    'distance': "(End Odometer - Start Odometer) does not equal the total distance logged from individual entries.",
+    'first_start': "Monthly log's start odometer reading does not match the first entry's start mileage.",
+    'last_end': "Monthly log's end odometer reading does not match the last entry's end mileage.",
+    'stored_total': "Stored total_distance_logged does not equal the total distance of the entries.",
+}
+
+REPORT_FIELDS = ['log_id', 'vehicle', 'year', 'month', 'check', 'expected', 'actual', 'message']
+
+
+def _entry_subquery(queryset, field):
+    return Subquery(queryset.values(field)[:1], output_field=models.DecimalField(max_digits=10, decimal_places=1))
+
+
+def _violation(log, check, expected, actual):
+    return {
+        'log_id': log.pk,
+        'vehicle': log.vehicle.name,
+        'year': log.year,
+        'month': log.month,
+        'check': check,
+        'expected': expected,
+        'actual': actual,
+        'message': CHECKS[check],
+    }
+
+
+def audit_monthly_logs(logs=None, vehicle=None, year_from=None, year_to=None):
+    """
+    Audits the given MonthlyMileageLog queryset (all logs by default), optionally limited
+    to one vehicle and an inclusive range of years.
+
+    Returns a list of violation dicts with the keys in REPORT_FIELDS, ordered by vehicle
+    and month. Logs without entries are only checked against their stored total.
+    """
+    if logs is None:
+        logs = MonthlyMileageLog.objects.all()
+    if vehicle is not None:
+        logs = logs.filter(vehicle=vehicle)
+    if year_from is not None:
+        logs = logs.filter(year__gte=year_from)
+    if year_to is not None:
+        logs = logs.filter(year__lte=year_to)
+
+    entries = MileageLogEntry.objects.filter(monthly_log=OuterRef('pk'))
+    logs = logs.annotate(
+        entry_count=Subquery(
+            entries.order_by().values('monthly_log').annotate(n=Count('pk')).values('n')[:1],
+            output_field=models.IntegerField(),
+        ),
+        entries_distance=Subquery(
+            entries.order_by().values('monthly_log').annotate(total=Sum('distance_traveled')).values('total')[:1],
+            output_field=models.DecimalField(max_digits=10, decimal_places=1),
+        ),
+        first_start=_entry_subquery(entries.order_by('entry_date', 'start_mileage'), 'start_mileage'),
+        last_end=_entry_subquery(entries.order_by('-entry_date', '-start_mileage'), 'end_mileage'),
+    ).select_related('vehicle').order_by('vehicle__name', 'year', 'month')
+
+    violations = []
+    for log in logs.iterator(chunk_size=2000):
+        logged = log.entries_distance or 0
+        checks = [('stored_total', logged, log.total_distance_logged)]
+        if log.entry_count:
+            checks += [
+                ('distance', log.end_odometer_reading - log.start_odometer_reading, logged),
+                ('first_start', log.start_odometer_reading, log.first_start),
+                ('last_end', log.end_odometer_reading, log.last_end),
+            ]
+        violations.extend(_violation(log, check, expected, actual) for check, expected, actual in checks if expected != actual)
+    return violations
@@ -0,0 +1,114 @@
+"""
+Set-based odometer continuity checks for MileageLogEntries and MonthlyMileageLogs.
+
+Every trip should start where the previous trip in the same monthly log ended.
+MileageLogEntry.clean() checks one entry at a time with a "previous entry" query; the
+functions here check whole logs, vehicles or the entire fleet at once, either with a
+single LAG() window query or with a linear scan over entries already in memory.
+
+Between months, each MonthlyMileageLog should start where the vehicle's previous log
+ended; month_boundary_breaks() checks that for the whole history with one LEAD() query.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import Lag, Lead
+
+from .models import MonthlyMileageLog, MileageLogEntry
+
+BOUNDARY_FIELDS = [
+    'kind', 'vehicle_id', 'vehicle', 'log_id', 'year', 'month', 'end_odometer_reading',
+    'next_log_id', 'next_year', 'next_month', 'next_start_odometer_reading', 'difference',
+]
+
+
+def find_continuity_breaks(entries):
+    """
+    Checks in-memory entries (saved or not) with a single sorted pass.
+
+    Entries can be MileageLogEntry instances or any objects with entry_date, start_mileage
+    and end_mileage attributes, all belonging to the same monthly log. Returns a list of
+    (previous_entry, entry) pairs where entry.start_mileage != previous_entry.end_mileage.
+    """
+    ordered = sorted(
+        (e for e in entries if e.entry_date is not None and e.start_mileage is not None),
+        key=lambda e: (e.entry_date, e.start_mileage),
+    )
+    breaks = []
+    for previous, entry in zip(ordered, ordered[1:]):
+        if previous.end_mileage is not None and entry.start_mileage != previous.end_mileage:
+            breaks.append((previous, entry))
+    return breaks
+
+
+def continuity_breaks(entries=None, per_vehicle=False):
+    """
+    Reports every continuity break among the given MileageLogEntry queryset (all entries
+    by default) in one query.
+
+    By default each monthly log is checked on its own, as in MileageLogEntry.clean().
+    With per_vehicle=True a vehicle's whole history is treated as one sequence, so a
+    month's first trip must also start where the previous month's last trip ended.
+
+    Returns a list of dicts with the entry's id, monthly_log_id, vehicle_id, entry_date,
+    start_mileage and the previous entry's end mileage (previous_end_mileage).
+    """
+    if entries is None:
+        entries = MileageLogEntry.objects.all()
+    if per_vehicle:
+        partition_by = [F('vehicle')]
+        order_by = ['year', 'month', 'entry_date', 'start_mileage']
+    else:
+        partition_by = [F('monthly_log')]
+        order_by = ['entry_date', 'start_mileage']
+
+    return list(
+        entries.annotate(
+            previous_end_mileage=Window(Lag('end_mileage'), partition_by=partition_by, order_by=order_by),
+        )
+        .filter(previous_end_mileage__isnull=False)
+        .exclude(start_mileage=F('previous_end_mileage'))
+        .order_by('vehicle_id', 'year', 'month', 'entry_date', 'start_mileage')
+        .values('id', 'monthly_log_id', 'vehicle_id', 'entry_date', 'start_mileage', 'previous_end_mileage')
+    )
+
+
+def month_boundary_breaks(logs=None):
+    """
+    Reports every place where a vehicle's monthly log doesn't start at the end reading of
+    its previous log, among the given MonthlyMileageLog queryset (all logs by default),
+    in one query. Each vehicle's logs are taken in (year, month) order; a month with no
+    log is skipped over rather than reported.
+
+    Returns a list of dicts with the keys in BOUNDARY_FIELDS, ordered by vehicle and month.
+    difference is the next log's start reading minus this log's end reading: kind is
+    'gap' when it is positive (miles driven that no log accounts for) and 'overlap' when
+    it is negative (miles counted in both months).
+    """
+    if logs is None:
+        logs = MonthlyMileageLog.objects.all()
+
+    def following(field):
+        return Window(Lead(field), partition_by=[F('vehicle')], order_by=['year', 'month'])
+
+    rows = (
+        logs.annotate(
+            next_log_id=following('pk'),
+            next_year=following('year'),
+            next_month=following('month'),
+            next_start_odometer_reading=following('start_odometer_reading'),
+        )
+        .filter(next_log_id__isnull=False)
+        .exclude(next_start_odometer_reading=F('end_odometer_reading'))
+        .order_by('vehicle__name', 'vehicle_id', 'year', 'month')
+        .values(
+            'vehicle_id', 'year', 'month', 'end_odometer_reading',
+            'next_log_id', 'next_year', 'next_month', 'next_start_odometer_reading',
+            log_id=F('pk'), vehicle_name=F('vehicle__name'),
+        )
+    )
+    breaks = []
+    for row in rows:
+        row['vehicle'] = row.pop('vehicle_name')
+        row['difference'] = row['next_start_odometer_reading'] - row['end_odometer_reading']
+        row['kind'] = 'gap' if row['difference'] > 0 else 'overlap'
+        breaks.append({field: row[field] for field in BOUNDARY_FIELDS})
+    return breaks
@@ -0,0 +1,137 @@
+"""
+Streaming CSV/XLSX exports of MileageLogEntries with their monthly log and MileageClaims.
+
+Entries are read with .iterator(chunk_size=...) and their claims prefetched one chunk
+at a time, so memory use stays flat however many rows are exported. CSV is streamed
+straight to the client, through an async iterator when served over ASGI (Django would
+otherwise buffer a sync iterator in full). XLSX is written row by row (openpyxl's
+write-only mode) once the response body is first iterated, then streamed from disk.
+
+An XLSX file is a zip archive, and openpyxl spools its worksheet to a temporary file
+until the workbook is saved, so no byte of an XLSX export can be sent before its last
+row has been read: memory stays flat, but the client waits for the whole export. CSV
+exports have no such delay.
+"""
+import csv
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+
+from .models import MileageLogEntry, MileageClaim
+
+CHUNK_SIZE = 2000
+
+# Bytes per chunk of a streamed XLSX file
+XLSX_CHUNK_BYTES = 64 * 1024
+
+EXPORT_HEADER = [
+    'vehicle', 'year', 'month', 'entry_date', 'start_mileage', 'end_mileage', 'distance_traveled',
+    'destination', 'purpose', 'is_long_distance', 'members_with_seats', 'total_claimed_seats',
+]
+
+
+def _export_queryset(entries):
+    if entries is None:
+        entries = MileageLogEntry.objects.all()
+    return entries.select_related('vehicle').prefetch_related(
+        Prefetch('mileageclaim_set', queryset=MileageClaim.objects.select_related('member').order_by('member__name'))
+    )
+
+
+def _entry_row(entry):
+    claims = entry.mileageclaim_set.all()
+    return [
+        entry.vehicle.name, entry.year, entry.month,
+        entry.entry_date, entry.start_mileage, entry.end_mileage, entry.distance_traveled,
+        entry.destination, entry.purpose, entry.is_long_distance,
+        ", ".join(f"{claim.member.name} ({claim.number_of_seats_claimed} seats)" for claim in claims),
+        sum(claim.number_of_seats_claimed for claim in claims),
+    ]
+
+
+def export_rows(entries=None):
+    """Yields the header and then one row per entry of the given MileageLogEntry queryset."""
+    yield EXPORT_HEADER
+    for entry in _export_queryset(entries).iterator(chunk_size=CHUNK_SIZE):
+        yield _entry_row(entry)
+
+
+async def aexport_rows(entries=None):
+    """Async version of export_rows()."""
+    yield EXPORT_HEADER
+    async for entry in _export_queryset(entries).aiterator(chunk_size=CHUNK_SIZE):
+        yield _entry_row(entry)
+
+
+class _Echo:
+    """A file-like object whose write() returns the value, so csv.writer output can be streamed."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def aiter_csv(rows):
+    writer = csv.writer(_Echo())
+    async for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, file):
+    """Writes rows to a write-only XLSX workbook, which keeps only the current row in memory."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Mileage log entries")
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
+
+
+def iter_xlsx(rows):
+    """
+    Yields an XLSX workbook of rows in chunks. The workbook is only written when the
+    first chunk is requested, and must be complete before it (see the module docstring).
+    """
+    with tempfile.TemporaryFile() as file:
+        write_xlsx(rows, file)
+        file.seek(0)
+        while chunk := file.read(XLSX_CHUNK_BYTES):
+            yield chunk
+
+
+async def aiter_xlsx(rows):
+    """Async version of iter_xlsx(); the sync rows are read in the thread sync views use."""
+    chunks = iter_xlsx(rows)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def csv_response(request, entries, filename='mileage_log_entries.csv'):
+    if isinstance(request, ASGIRequest):
+        content = aiter_csv(aexport_rows(entries))
+    else:
+        content = iter_csv(export_rows(entries))
+    response = StreamingHttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(request, entries, filename='mileage_log_entries.xlsx'):
+    if isinstance(request, ASGIRequest):
+        content = aiter_xlsx(export_rows(entries))
+    else:
+        content = iter_xlsx(export_rows(entries))
+    response = StreamingHttpResponse(
+        content, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,182 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
+
+from nested_admin.formsets import NestedInlineFormSet
+
+from ___.pagination import KeysetPaginator
+from members.forms import MemberSeatsField
+from .continuity import find_continuity_breaks
+from .models import MileageLogEntry
+
+ENTRY_ORDERING = ('entry_date', 'start_mileage', 'pk')
+
+
+class MileageLogEntryInlineFormSet(NestedInlineFormSet):
+    """
+    Validates odometer continuity for all submitted entries of a monthly log together,
+    in memory, instead of each form querying the database for its previous entry.
+    Entries of the log that aren't part of the formset are fetched in one query.
+
+    With per_page set, only one keyset page of the log's entries (after the after
+    cursor, or before the before cursor) gets a form. Rows that are submitted unchanged
+    are neither validated nor saved, so a save costs what was edited, not the month.
+    """
+    # Set per request by MileageLogEntryInline.get_formset(); None gives every entry a form
+    per_page = None
+    after = None
+    before = None
+    page = None
+
+    def get_queryset(self):
+        if not self.per_page:
+            return super().get_queryset()
+        if hasattr(self, '_queryset'):
+            return self._queryset
+        if self.data:
+            # Submitted rows are looked up by the ids they were rendered with; unlike
+            # nested_admin's own lookup, this keeps the inline's select_related and runs once
+            pks = [self.data.get(f'{self.add_prefix(i)}-{self.model._meta.pk.name}') for i in range(self.initial_form_count())]
+            self._queryset = self.queryset.filter(pk__in=[pk for pk in pks if pk]).order_by(*ENTRY_ORDERING)
+        else:
+            paginator = KeysetPaginator(self.queryset, self.per_page, ENTRY_ORDERING)
+            try:
+                self.page = paginator.page(after=self.after, before=self.before)
+            except InvalidPage as e:
+                raise Http404(str(e))
+            self._queryset = self.queryset.filter(pk__in=[entry.pk for entry in self.page]).order_by(*ENTRY_ORDERING)
+        return self._queryset
+
+    def _construct_form(self, i, **kwargs):
+        if i < self.initial_form_count():
+            kwargs.setdefault('empty_permitted', True)
+        form = super()._construct_form(i, **kwargs)
+        # The formset checks continuity itself in clean(), against the submitted rows.
+        form.instance._skip_continuity_check = True
+        return form
+
+    def clean(self):
+        super().clean()
+        # Keyed by id() since unsaved model instances aren't hashable.
+        submitted = {}
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or not form.cleaned_data or self._should_delete_form(form):
+                continue
+            if form.errors:
+                # Continuity can't be judged reliably until the row itself is valid.
+                return
+            submitted[id(form.instance)] = form
+
+        entries = [form.instance for form in submitted.values()]
+        if self.instance.pk:
+            # Unchanged rows weren't cleaned; they are compared as stored, like the other pages
+            form_pks = [form.instance.pk for form in self.forms if form.instance.pk and form.has_changed()]
+            entries += list(self.instance.log_entries.exclude(pk__in=form_pks).order_by().only('monthly_log', 'entry_date', 'start_mileage', 'end_mileage'))
+
+        for previous, entry in find_continuity_breaks(entries):
+            message = _("Start mileage must match the previous entry's end mileage (%(end)s).") % {'end': previous.end_mileage}
+            if id(entry) in submitted:
+                submitted[id(entry)].add_error('start_mileage', message)
+            else:
+                raise ValidationError(_("Entry on %(date)s: %(message)s") % {'date': entry.entry_date, 'message': message})
+
+    def save_existing_objects(self, initial_forms=None, commit=True):
+        # nested_admin reads every initial row back from the database while saving it
+        initial_forms = [form for form in initial_forms or () if form.has_changed()]
+        return super().save_existing_objects(initial_forms, commit)
+
+
+class EntryGridRowForm(forms.Form):
+    """One trip of the bulk entry grid; see EntryGridFormSet."""
+    entry_date = forms.DateField(widget=forms.DateInput(attrs={'size': 10}))
+    start_mileage = forms.DecimalField(max_digits=10, decimal_places=0, widget=forms.TextInput(attrs={'size': 8}))
+    end_mileage = forms.DecimalField(max_digits=10, decimal_places=0, widget=forms.TextInput(attrs={'size': 8}))
+    destination = forms.CharField(required=False, widget=forms.TextInput(attrs={'size': 16}))
+    purpose = forms.CharField(required=False, widget=forms.TextInput(attrs={'size': 16}))
+    is_long_distance = forms.BooleanField(required=False)
+    claims = MemberSeatsField(required=False, widget=forms.TextInput(attrs={'size': 30}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start_mileage'), cleaned_data.get('end_mileage')
+        if start is not None and end is not None and end < start:
+            self.add_error('end_mileage', _("End mileage must be greater than or equal to start mileage."))
+        return cleaned_data
+
+
+class BaseEntryGridFormSet(forms.BaseFormSet):
+    """
+    A sheet of new trips for one monthly log, typed in like the paper log and submitted
+    as one batch. Blank rows are ignored. The filled-in rows are validated together in
+    memory: each date must fall in the log's month, and the trips must continue the
+    odometer readings of each other and of the entries the log already has (fetched in
+    one query). rows() returns them in the form bulk_ingest_entries() takes.
+    """
+
+    def __init__(self, *args, monthly_log, extra=None, **kwargs):
+        self.monthly_log = monthly_log
+        if extra is not None:
+            self.extra = extra
+        super().__init__(*args, **kwargs)
+
+    def filled_forms(self):
+        return [form for form in self.forms if form.has_changed()]
+
+    def clean(self):
+        filled = self.filled_forms()
+        if not filled:
+            raise ValidationError(_("Enter at least one trip."))
+
+        log = self.monthly_log
+        submitted = {}
+        for form in filled:
+            # Rows with an unreadable date or reading are left out, the rest still checked
+            if not all(field in form.cleaned_data for field in ('entry_date', 'start_mileage', 'end_mileage')):
+                continue
+            entry_date = form.cleaned_data['entry_date']
+            if (entry_date.year, entry_date.month) != (log.year, log.month):
+                form.add_error('entry_date', _("Entry date must be within the selected monthly log's year and month."))
+                continue
+            entry = MileageLogEntry(
+                entry_date=entry_date, start_mileage=form.cleaned_data['start_mileage'], end_mileage=form.cleaned_data['end_mileage'],
+            )
+            submitted[id(entry)] = (entry, form)
+
+        existing = list(log.log_entries.order_by().only('monthly_log', 'entry_date', 'start_mileage', 'end_mileage'))
+        taken = {(entry.entry_date, entry.start_mileage) for entry in existing}
+        for entry, form in submitted.values():
+            key = (entry.entry_date, entry.start_mileage)
+            if key in taken:
+                form.add_error('start_mileage', _("Another trip on this date already starts at this mileage."))
+            taken.add(key)
+
+        entries = existing + [entry for entry, form in submitted.values()]
+        for previous, entry in find_continuity_breaks(entries):
+            # Only breaks the sheet introduces; the log's own entries are the admin's business
+            if id(entry) in submitted:
+                message = _("Start mileage must match the previous entry's end mileage (%(end)s).") % {'end': previous.end_mileage}
+                submitted[id(entry)][1].add_error('start_mileage', message)
+            elif id(previous) in submitted:
+                message = _("End mileage must match the next entry's start mileage (%(start)s).") % {'start': entry.start_mileage}
+                submitted[id(previous)][1].add_error('end_mileage', message)
+
+    def rows(self):
+        """Returns the filled-in rows as bulk_ingest_entries() rows."""
+        return [
+            {
+                'monthly_log': self.monthly_log.pk,
+                'entry_date': form.cleaned_data['entry_date'],
+                'start_mileage': form.cleaned_data['start_mileage'],
+                'end_mileage': form.cleaned_data['end_mileage'],
+                'destination': form.cleaned_data['destination'],
+                'purpose': form.cleaned_data['purpose'],
+                'is_long_distance': form.cleaned_data['is_long_distance'],
+                'claims': [{'member': member_id, 'seats': seats} for member_id, seats in form.cleaned_data['claims'] or ()],
+            }
+            for form in self.filled_forms()
+        ]
+
+
+EntryGridFormSet = forms.formset_factory(EntryGridRowForm, formset=BaseEntryGridFormSet, extra=25, max_num=500, absolute_max=500)
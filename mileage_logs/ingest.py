@@ -0,0 +1,198 @@
+"""
+Bulk ingestion of MileageLogEntries and their MileageClaims.
+
+MileageLogEntry.save() keeps the parent MonthlyMileageLog and Vehicle up to date one
+row at a time, which costs several queries per entry. bulk_ingest_entries() instead
+validates a whole batch in memory, inserts it with bulk_create() inside a single
+transaction and then recomputes the derived fields (and the MemberMonthlyUsage rollup)
+once per affected log and vehicle.
+
+The checks MileageLogEntry.clean() and the unique constraint make one entry at a time
+(odometer continuity, one entry per log, date and start mileage) are made for the whole
+batch against the logs' stored entries, fetched in one query while the logs are locked.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from ___ import cache
+from members.models import Member
+from members.resolver import resolver
+from .continuity import find_continuity_breaks
+from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim
+from .recompute import lock_monthly_logs, recompute_monthly_logs, recompute_vehicle_mileage, refresh_member_usage
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _resolve_members(references):
+    """
+    Maps member references to Member ids: ids with one query, names and aliases
+    through the in-memory resolver (case- and whitespace-insensitive).
+    """
+    ids = {ref for ref in references if isinstance(ref, int)}
+    names = {ref for ref in references if isinstance(ref, str)}
+    resolved = {pk: pk for pk in Member.objects.filter(pk__in=ids).values_list('pk', flat=True)} if ids else {}
+    resolved.update(resolver.resolve_many(names))
+    return resolved
+
+
+def bulk_ingest_entries(rows):
+    """
+    Creates MileageLogEntries (and their MileageClaims) from a list of dicts of the form:
+
+        {
+            "monthly_log": 12,
+            "entry_date": "2024-05-03",
+            "start_mileage": 10250,
+            "end_mileage": 10312,
+            "destination": "Memphis",        # optional
+            "purpose": "Shopping",           # optional
+            "is_long_distance": False,       # optional
+            "claims": [{"member": "Alice", "seats": 2}, {"member": 7}],
+        }
+
+    Members may be given by id, name or alias (matched case- and whitespace-insensitively).
+    Rows may target any number of monthly logs. Each log's trips, old and new, must
+    continue each other's odometer readings, and no two may share a date and start mileage.
+    Raises ValidationError listing every invalid row; nothing is written in that case.
+    Returns the list of created MileageLogEntries.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    logs = MonthlyMileageLog.objects.in_bulk({row.get('monthly_log') for row in rows})
+    members = _resolve_members({claim.get('member') for row in rows for claim in row.get('claims', [])})
+
+    errors = []
+    entries = []
+    row_numbers = []
+    claims_per_entry = []
+    for index, row in enumerate(rows):
+        row_errors = []
+        monthly_log = logs.get(row.get('monthly_log'))
+        entry_date = _to_date(row.get('entry_date'))
+        start_mileage = _to_decimal(row.get('start_mileage'))
+        end_mileage = _to_decimal(row.get('end_mileage'))
+
+        if monthly_log is None:
+            row_errors.append(f"unknown monthly log {row.get('monthly_log')!r}")
+        if entry_date is None:
+            row_errors.append(f"invalid entry date {row.get('entry_date')!r}")
+        if start_mileage is None or end_mileage is None:
+            row_errors.append("start and end mileage are required")
+        elif end_mileage < start_mileage:
+            row_errors.append("end mileage must be greater than or equal to start mileage")
+        if monthly_log and entry_date and (entry_date.year, entry_date.month) != (monthly_log.year, monthly_log.month):
+            row_errors.append("entry date must be within the monthly log's year and month")
+
+        claims = []
+        for claim in row.get('claims', []):
+            member_id = members.get(claim.get('member'))
+            seats = claim.get('seats', 1)
+            if member_id is None:
+                row_errors.append(f"unknown member {claim.get('member')!r}")
+            elif not isinstance(seats, int) or isinstance(seats, bool) or seats < 1:
+                row_errors.append(f"invalid number of seats {seats!r} for member {claim.get('member')!r}")
+            else:
+                claims.append((member_id, seats))
+        if len({member_id for member_id, _ in claims}) != len(claims):
+            row_errors.append("a member can only claim seats once per entry")
+
+        if row_errors:
+            errors.append(f"Row {index + 1}: " + "; ".join(row_errors))
+            continue
+
+        row_numbers.append(index + 1)
+        entries.append(MileageLogEntry(
+            monthly_log=monthly_log,
+            vehicle_id=monthly_log.vehicle_id,
+            year=monthly_log.year,
+            month=monthly_log.month,
+            entry_date=entry_date,
+            start_mileage=start_mileage,
+            end_mileage=end_mileage,
+            distance_traveled=end_mileage - start_mileage,
+            destination=row.get('destination', ''),
+            purpose=row.get('purpose', ''),
+            is_long_distance=bool(row.get('is_long_distance', False)),
+        ))
+        claims_per_entry.append(claims)
+
+    if errors:
+        raise ValidationError(errors)
+
+    log_ids = {entry.monthly_log_id for entry in entries}
+    try:
+        with transaction.atomic():
+            # Locked first, so no other writer adds entries between the checks and the inserts
+            lock_monthly_logs(log_ids)
+            errors = _check_against_stored_entries(entries, row_numbers, log_ids)
+            if errors:
+                raise ValidationError(errors)
+            MileageLogEntry.objects.bulk_create(entries)
+            MileageClaim.objects.bulk_create([
+                MileageClaim(mileage_log_entry=entry, member_id=member_id, number_of_seats_claimed=seats)
+                for entry, claims in zip(entries, claims_per_entry)
+                for member_id, seats in claims
+            ])
+            recompute_monthly_logs(log_ids)
+            recompute_vehicle_mileage({entry.vehicle_id for entry in entries})
+            refresh_member_usage(log_ids)
+            # bulk_create() and update() don't send the signals that invalidate caches
+            cache.invalidate_on_commit(cache.MILEAGE_LOGS, cache.VEHICLES, cache.REPORTS)
+    except IntegrityError as e:
+        # An entry saved concurrently on a database without row locks, or a member deleted
+        raise ValidationError(f"The entries conflict with changes saved meanwhile ({e}); nothing was written.")
+
+    return entries
+
+
+def _check_against_stored_entries(entries, row_numbers, log_ids):
+    """
+    Returns the duplicate and continuity errors of the new entries, checked per monthly
+    log together with the log's stored entries (one query for all logs).
+    """
+    by_log = defaultdict(list)
+    taken = set()
+    for entry in MileageLogEntry.objects.filter(monthly_log__in=log_ids).order_by().only(
+        'monthly_log', 'entry_date', 'start_mileage', 'end_mileage',
+    ):
+        by_log[entry.monthly_log_id].append(entry)
+        taken.add((entry.monthly_log_id, entry.entry_date, entry.start_mileage))
+
+    row_of = {id(entry): number for entry, number in zip(entries, row_numbers)}
+    errors = defaultdict(list)
+    for entry in entries:
+        key = (entry.monthly_log_id, entry.entry_date, entry.start_mileage)
+        if key in taken:
+            errors[row_of[id(entry)]].append("another entry of the log already starts at this mileage on this date")
+            continue
+        taken.add(key)
+        by_log[entry.monthly_log_id].append(entry)
+
+    for log_entries in by_log.values():
+        for previous, entry in find_continuity_breaks(log_entries):
+            if id(entry) in row_of:
+                errors[row_of[id(entry)]].append(f"start mileage must match the previous entry's end mileage ({previous.end_mileage})")
+            elif id(previous) in row_of:
+                errors[row_of[id(previous)]].append(f"end mileage must match the next entry's start mileage ({entry.start_mileage})")
+    return [f"Row {number}: " + "; ".join(messages) for number, messages in sorted(errors.items())]
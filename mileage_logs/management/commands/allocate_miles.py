@@ -0,0 +1,27 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mileage_logs.allocation import allocate_member_miles
+from mileage_logs.months import parse_year_month
+
+
+class Command(BaseCommand):
+    help = "Reports each member's seat-weighted share of the miles driven in a range of months."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First month (YYYY-MM, inclusive)")
+        parser.add_argument('--to', dest='end', help="Last month (YYYY-MM, inclusive)")
+        parser.add_argument('--vehicle', type=int, help="Only include trips in this vehicle (id)")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_year_month(options['start']) if options['start'] else None
+            end = parse_year_month(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(e)
+        rows = allocate_member_miles(start, end, options['vehicle'])
+
+        writer = csv.DictWriter(self.stdout, fieldnames=['member_id', 'member_name', 'trips', 'seats', 'miles'])
+        writer.writeheader()
+        writer.writerows(rows)
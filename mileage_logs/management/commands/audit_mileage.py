@@ -0,0 +1,41 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.models import Vehicle
+from mileage_logs.audit import REPORT_FIELDS, audit_monthly_logs
+
+
+class Command(BaseCommand):
+    help = "Audits the checksums of every monthly mileage log and reports all violations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', help="Only audit this vehicle (id or name)")
+        parser.add_argument('--from-year', type=int, help="First year to audit (inclusive)")
+        parser.add_argument('--to-year', type=int, help="Last year to audit (inclusive)")
+        parser.add_argument('--format', choices=['text', 'json', 'csv'], default='text')
+
+    def handle(self, *args, **options):
+        vehicle = None
+        if options['vehicle']:
+            lookup = {'pk': options['vehicle']} if options['vehicle'].isdigit() else {'name': options['vehicle']}
+            try:
+                vehicle = Vehicle.objects.get(**lookup)
+            except (Vehicle.DoesNotExist, Vehicle.MultipleObjectsReturned):
+                raise CommandError(f"Could not find a single vehicle matching {options['vehicle']!r}")
+
+        violations = audit_monthly_logs(vehicle=vehicle, year_from=options['from_year'], year_to=options['to_year'])
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(violations, indent=2, default=str))
+        elif options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(violations)
+        else:
+            for v in violations:
+                self.stdout.write(f"{v['vehicle']} {v['year']}-{v['month']:02d} (log {v['log_id']}): {v['message']} "
+                                  f"Expected {v['expected']}, found {v['actual']}.")
+            style = self.style.ERROR if violations else self.style.SUCCESS
+            self.stdout.write(style(f"{len(violations)} checksum violations found."))
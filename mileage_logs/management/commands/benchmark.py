@@ -0,0 +1,251 @@
+import datetime
+import json
+import platform
+import statistics
+import time
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.test import Client
+from django.urls import reverse
+
+from members.models import Member
+from mileage_logs.allocation import allocate_member_miles
+from mileage_logs.audit import audit_monthly_logs
+from mileage_logs.continuity import continuity_breaks, month_boundary_breaks
+from mileage_logs.models import MonthlyMileageLog, MileageLogEntry
+from mileage_logs.reports import member_miles_report, monthly_log_summary
+from mileage_logs.timeline import odometer_timeline
+from vehicles.models import Vehicle
+
+BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+# Logs created by the write benchmarks go far after the generated fleet's history
+BENCHMARK_YEAR = 2090
+
+
+def default_baseline():
+    return BASELINE_DIR / f'baseline-{connection.vendor}.json'
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of results against baseline: any benchmark that now runs more
+    queries, or takes more than (1 + tolerance) times as long.
+    """
+    regressions = []
+    for size, benchmarks in results['results'].items():
+        for name, current in benchmarks.items():
+            previous = baseline.get('results', {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{name} @ {size}: {previous['queries']} -> {current['queries']} queries")
+            if current['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append(f"{name} @ {size}: {previous['seconds']:.4f}s -> {current['seconds']:.4f}s")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the mileage write path, the admin pages and the reports at several data sizes, "
+        "in a throwaway test database, and compares the timings and query counts with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='2,8', help="Comma-separated fleet sizes (vehicles) to benchmark at")
+        parser.add_argument('--years', type=int, default=2, help="Years of history per generated vehicle")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the median time is reported")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--baseline', help="Baseline JSON to compare with (default: benchmarks/baseline-<database>.json)")
+        parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed slowdown against the baseline (0.5 = 50%%)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError(f"Expected comma-separated numbers, got {options['sizes']!r}")
+        baseline_path = Path(options['baseline']) if options['baseline'] else default_baseline()
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Caches off, so every run does its queries; budgets off, as the writes are deliberately large
+            with override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                REQUEST_BUDGETS={},
+            ):
+                results = self.run_benchmarks(sizes, options['years'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['output'] and Path(options['output']).resolve() == baseline_path.resolve():
+            self.stderr.write(self.style.SUCCESS(f"Wrote a new baseline to {baseline_path}."))
+            return
+        if not baseline_path.exists():
+            self.stderr.write(f"No baseline at {baseline_path}; nothing to compare with.")
+            return
+        regressions = compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stderr.write(self.style.SUCCESS(f"No regressions against {baseline_path}."))
+
+    def run_benchmarks(self, sizes, years, repeat):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark'))
+        self.vehicle = Vehicle.objects.create(name="Benchmark", year=2020, make="Ford", model="Transit", is_active=False)
+        self.next_log = 0
+
+        results = {}
+        generated = 0
+        for size in sizes:
+            call_command(
+                'generate_fleet', vehicles=size - generated, members=max(5, (size - generated) * 5), years=years,
+                trips_per_month=40, seed=size, stdout=StringIO(),
+            )
+            generated = size
+            self.stderr.write(f"Benchmarking {MileageLogEntry.objects.count()} entries in {size} vehicles...")
+            results[str(size)] = {
+                name: self.measure(getattr(self, name), repeat)
+                for name in (
+                    'entry_save', 'admin_formset_save', 'admin_log_changelist', 'admin_entry_changelist',
+                    'monthly_log_summary', 'member_miles_report', 'allocate_member_miles', 'audit_monthly_logs',
+                    'continuity_breaks', 'month_boundary_breaks', 'odometer_timeline',
+                )
+            }
+        return {
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'years': years,
+            'results': results,
+        }
+
+    def measure(self, prepare, repeat):
+        """
+        Times repeat runs of a benchmark. prepare() sets up a fresh run (untimed) and
+        returns (run, operations); the result has the median seconds per run, operations
+        per second and the queries of one run.
+        """
+        timings = []
+        for _ in range(repeat):
+            run, operations = prepare()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+        seconds = statistics.median(timings)
+        return {
+            'seconds': round(seconds, 6),
+            'operations': operations,
+            'per_second': round(operations / seconds, 1) if seconds else None,
+            'queries': len(queries),
+        }
+
+    def new_log(self):
+        year, month = BENCHMARK_YEAR + self.next_log // 12, self.next_log % 12 + 1
+        self.next_log += 1
+        return MonthlyMileageLog.objects.create(
+            vehicle=self.vehicle, year=year, month=month, start_odometer_reading=0, end_odometer_reading=0,
+        )
+
+    def busiest_log(self):
+        return MonthlyMileageLog.objects.exclude(vehicle=self.vehicle).order_by('-total_distance_logged', 'pk').first()
+
+    # --- Write path ---
+
+    def entry_save(self, count=100):
+        log = self.new_log()
+
+        def run():
+            # One transaction per entry, like entries saved one at a time from forms
+            for i in range(count):
+                MileageLogEntry.objects.create(
+                    monthly_log=log, entry_date=datetime.date(log.year, log.month, 1 + i % 28),
+                    start_mileage=i * 10, end_mileage=i * 10 + 10,
+                )
+        return run, count
+
+    def admin_formset_save(self, count=20):
+        log = self.new_log()
+        member = Member.objects.order_by('pk').first()
+        data = {
+            'vehicle': log.vehicle_id, 'year': log.year, 'month': log.month,
+            'start_odometer_reading': 0, 'end_odometer_reading': 0,
+            'log_entries-TOTAL_FORMS': count, 'log_entries-INITIAL_FORMS': 0,
+            'log_entries-MIN_NUM_FORMS': 0, 'log_entries-MAX_NUM_FORMS': 1000,
+            '_save': 'Save',
+        }
+        for i in range(count):
+            prefix = f'log_entries-{i}'
+            data.update({
+                f'{prefix}-monthly_log': log.pk,
+                f'{prefix}-entry_date': f'{log.year}-{log.month:02d}-{1 + i % 28:02d}',
+                f'{prefix}-start_mileage': i * 10, f'{prefix}-end_mileage': i * 10 + 10,
+                f'{prefix}-destination': '', f'{prefix}-purpose': '',
+                f'{prefix}-mileageclaim_set-TOTAL_FORMS': 1, f'{prefix}-mileageclaim_set-INITIAL_FORMS': 0,
+                f'{prefix}-mileageclaim_set-MIN_NUM_FORMS': 0, f'{prefix}-mileageclaim_set-MAX_NUM_FORMS': 1000,
+                f'{prefix}-mileageclaim_set-0-member': member.pk,
+                f'{prefix}-mileageclaim_set-0-number_of_seats_claimed': 1,
+            })
+        url = reverse('admin:mileage_logs_monthlymileagelog_change', args=[log.pk])
+
+        def run():
+            response = self.client.post(url, data)
+            if response.status_code != 302:
+                raise CommandError(f"The admin rejected the benchmark formset (status {response.status_code}).")
+        return run, count
+
+    # --- Admin pages ---
+
+    def get(self, url):
+        def run():
+            response = self.client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} returned {response.status_code}.")
+        return run
+
+    def admin_log_changelist(self):
+        return self.get(reverse('admin:mileage_logs_monthlymileagelog_changelist')), 1
+
+    def admin_entry_changelist(self):
+        return self.get(reverse('admin:mileage_logs_mileagelogentry_changelist')), 1
+
+    # --- Reports and aggregates ---
+
+    def monthly_log_summary(self):
+        log_id = self.busiest_log().pk
+        return lambda: monthly_log_summary(log_id), 1
+
+    def member_miles_report(self):
+        return lambda: member_miles_report(), 1
+
+    def allocate_member_miles(self):
+        return lambda: allocate_member_miles(), 1
+
+    def audit_monthly_logs(self):
+        return lambda: audit_monthly_logs(), 1
+
+    def continuity_breaks(self):
+        return lambda: continuity_breaks(per_vehicle=True), 1
+
+    def month_boundary_breaks(self):
+        return lambda: month_boundary_breaks(), 1
+
+    def odometer_timeline(self):
+        vehicle_id = self.busiest_log().vehicle_id
+        return lambda: odometer_timeline(vehicle_id), 1
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.models import Vehicle
+from mileage_logs.continuity import BOUNDARY_FIELDS, month_boundary_breaks
+from mileage_logs.models import MonthlyMileageLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that every monthly mileage log starts at the end reading of the vehicle's "
+        "previous log, and reports the gaps and overlaps."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', help="Only check this vehicle (id or name)")
+        parser.add_argument('--format', choices=['text', 'json', 'csv'], default='text')
+
+    def handle(self, *args, **options):
+        logs = MonthlyMileageLog.objects.all()
+        if options['vehicle']:
+            lookup = {'pk': options['vehicle']} if options['vehicle'].isdigit() else {'name': options['vehicle']}
+            try:
+                logs = logs.filter(vehicle=Vehicle.objects.get(**lookup))
+            except (Vehicle.DoesNotExist, Vehicle.MultipleObjectsReturned):
+                raise CommandError(f"Could not find a single vehicle matching {options['vehicle']!r}")
+
+        breaks = month_boundary_breaks(logs)
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(breaks, indent=2, default=str))
+        elif options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=BOUNDARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(breaks)
+        else:
+            for b in breaks:
+                self.stdout.write(
+                    f"{b['vehicle']} {b['year']}-{b['month']:02d} -> {b['next_year']}-{b['next_month']:02d}: "
+                    f"{b['kind']} of {abs(b['difference'])} (ended at {b['end_odometer_reading']}, "
+                    f"next log starts at {b['next_start_odometer_reading']})."
+                )
+            style = self.style.ERROR if breaks else self.style.SUCCESS
+            self.stdout.write(style(f"{len(breaks)} month boundary breaks found."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mileage_logs.exports import iter_csv, export_rows, write_xlsx
+from mileage_logs.models import MileageLogEntry
+
+
+class Command(BaseCommand):
+    help = "Exports mileage log entries and their seat claims as CSV or XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', '-o', help="Output file (CSV defaults to stdout)")
+        parser.add_argument('--vehicle', type=int, help="Only export this vehicle (id)")
+        parser.add_argument('--from-year', type=int, help="First year to export (inclusive)")
+        parser.add_argument('--to-year', type=int, help="Last year to export (inclusive)")
+
+    def handle(self, *args, **options):
+        entries = MileageLogEntry.objects.all()
+        if options['vehicle']:
+            entries = entries.filter(vehicle=options['vehicle'])
+        if options['from_year']:
+            entries = entries.filter(year__gte=options['from_year'])
+        if options['to_year']:
+            entries = entries.filter(year__lte=options['to_year'])
+
+        rows = export_rows(entries)
+        if options['format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError("--output is required for XLSX exports")
+            with open(options['output'], 'wb') as f:
+                write_xlsx(rows, f)
+        elif options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(iter_csv(rows))
+        else:
+            for line in iter_csv(rows):
+                self.stdout.write(line, ending='')
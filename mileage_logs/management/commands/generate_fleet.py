@@ -0,0 +1,158 @@
+import calendar
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ___ import cache
+from members.models import Member, MemberAlias
+from mileage_logs.models import MonthlyMileageLog, MileageLogEntry, MileageClaim
+from mileage_logs.months import parse_year_month
+from mileage_logs.recompute import refresh_member_usage
+from mileage_logs.rollover import next_month
+from vehicles.models import Vehicle
+
+FIRST_NAMES = [
+    "Ada", "Ben", "Cara", "Dev", "Elena", "Finn", "Grace", "Hugo", "Iris", "Jonah", "Kira", "Leo",
+    "Maya", "Nils", "Olive", "Pablo", "Quinn", "Rosa", "Sami", "Tess", "Umar", "Vera", "Wes", "Yara", "Zane",
+]
+LAST_NAMES = [
+    "Abbott", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jensen", "Khan", "Lopez",
+    "Moreau", "Novak", "Okafor", "Patel", "Quist", "Rossi", "Silva", "Tanaka", "Ueda", "Vogel", "Weber", "Young",
+]
+MODELS = [("Toyota", "Prius", Vehicle.HYBRID), ("Ford", "Transit", Vehicle.GASOLINE), ("Nissan", "Leaf", Vehicle.ELECTRIC),
+          ("Honda", "Fit", Vehicle.GASOLINE), ("VW", "Golf TDI", Vehicle.DIESEL), ("Toyota", "Sienna", Vehicle.HYBRID)]
+DESTINATIONS = ["Memphis", "Fairfield", "Quincy", "Kirksville", "Rutledge", "Ottumwa", "Columbia", "Keokuk"]
+PURPOSES = ["Shopping", "Appointment", "Errands", "Visit", "Work", "Train station"]
+
+
+def unique(name, taken):
+    """Returns name, or name with the lowest numeric suffix that isn't in taken; adds it to taken."""
+    candidate, n = name, 2
+    while candidate in taken:
+        candidate, n = f"{name} {n}", n + 1
+    taken.add(candidate)
+    return candidate
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with a synthetic fleet: vehicles, members with aliases, and years of "
+        "continuous, checksum-valid monthly logs, trip entries and seat claims, inserted in bulk. "
+        "The same options and --seed always generate the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=20)
+        parser.add_argument('--members', type=int, default=100)
+        parser.add_argument('--years', type=int, default=5, help="Years of monthly logs per vehicle")
+        parser.add_argument('--start', default='2020-01', help="First month (YYYY-MM)")
+        parser.add_argument('--trips-per-month', type=int, default=40, help="Average trips per vehicle and month")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT statement")
+
+    def handle(self, *args, **options):
+        if min(options['vehicles'], options['members'], options['years']) < 1 or options['trips_per_month'] < 0:
+            raise CommandError("--vehicles, --members and --years must be at least 1, --trips-per-month at least 0.")
+        try:
+            start = parse_year_month(options['start'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        member_ids = self.create_members(options['members'])
+        vehicles = self.create_vehicles(options['vehicles'])
+        months = [start]
+        for _ in range(options['years'] * 12 - 1):
+            months.append(next_month(*months[-1]))
+
+        entry_count = 0
+        for number, vehicle in enumerate(vehicles, start=1):
+            entry_count += self.create_history(vehicle, months, options['trips_per_month'], member_ids)
+            self.stdout.write(f"Vehicle {number}/{len(vehicles)}: {entry_count} entries so far.")
+
+        # Nothing above sends the signals that invalidate the caches and the member resolver
+        cache.invalidate(cache.MEMBERS, cache.VEHICLES, cache.MILEAGE_LOGS, cache.REPORTS)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(vehicles)} vehicles, {len(member_ids)} members, {len(vehicles) * len(months)} monthly logs "
+            f"and {entry_count} entries in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def create_members(self, count):
+        names = set(Member.objects.values_list('name', flat=True))
+        alias_names = set(MemberAlias.objects.values_list('name', flat=True))
+        members = []
+        for _ in range(count):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            name = unique(f"{first} {last}", names)
+            members.append(Member(name=name, email=f"{name.lower().replace(' ', '.')}@example.com"))
+        with transaction.atomic():
+            Member.objects.bulk_create(members, batch_size=self.batch_size)
+            aliases = []
+            for member in members:
+                first, last = member.name.split(' ', 1)
+                # The spellings paper logs use: an initial, or the first name alone
+                for alias in (f"{first[0]}. {last}", first)[:self.rng.randint(1, 2)]:
+                    if alias not in alias_names and alias not in names:
+                        alias_names.add(alias)
+                        aliases.append(MemberAlias(name=alias, member=member))
+            MemberAlias.objects.bulk_create(aliases, batch_size=self.batch_size)
+        return [member.pk for member in members]
+
+    def create_vehicles(self, count):
+        names = set(Vehicle.objects.values_list('name', flat=True))
+        vehicles = []
+        for _ in range(count):
+            make, model, fuel_type = self.rng.choice(MODELS)
+            vehicles.append(Vehicle(
+                name=unique(f"{make} {model}", names), year=self.rng.randint(2005, 2020), make=make, model=model,
+                fuel_type=fuel_type, current_mileage=self.rng.randint(0, 80000),
+            ))
+        Vehicle.objects.bulk_create(vehicles, batch_size=self.batch_size)
+        return vehicles
+
+    def create_history(self, vehicle, months, trips_per_month, member_ids):
+        """Creates the vehicle's monthly logs, entries and claims; returns the number of entries."""
+        reading = int(vehicle.current_mileage)
+        logs, trips_per_log = [], []
+        for year, month in months:
+            trips = []
+            days = calendar.monthrange(year, month)[1]
+            count = self.rng.randint(trips_per_month // 2, trips_per_month * 3 // 2) if trips_per_month else 0
+            for day in sorted(self.rng.randint(1, days) for _ in range(count)):
+                long_distance = self.rng.random() < 0.05
+                distance = self.rng.randint(100, 400) if long_distance else self.rng.randint(2, 60)
+                trips.append((datetime.date(year, month, day), reading, reading + distance, long_distance))
+                reading += distance
+            start_reading = trips[0][1] if trips else reading
+            logs.append(MonthlyMileageLog(
+                vehicle=vehicle, year=year, month=month, start_odometer_reading=start_reading,
+                end_odometer_reading=reading, total_distance_logged=reading - start_reading,
+            ))
+            trips_per_log.append(trips)
+
+        with transaction.atomic():
+            MonthlyMileageLog.objects.bulk_create(logs, batch_size=self.batch_size)
+            entries = [
+                MileageLogEntry(
+                    monthly_log=log, vehicle=vehicle, year=log.year, month=log.month, entry_date=entry_date,
+                    start_mileage=start, end_mileage=end, distance_traveled=end - start, is_long_distance=long_distance,
+                    destination=self.rng.choice(DESTINATIONS), purpose=self.rng.choice(PURPOSES),
+                )
+                for log, trips in zip(logs, trips_per_log)
+                for entry_date, start, end, long_distance in trips
+            ]
+            MileageLogEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+            claims = [
+                MileageClaim(mileage_log_entry=entry, member_id=member_id, number_of_seats_claimed=self.rng.choice((1, 1, 1, 2)))
+                for entry in entries
+                for member_id in self.rng.sample(member_ids, min(len(member_ids), self.rng.randint(1, 3)))
+            ]
+            MileageClaim.objects.bulk_create(claims, batch_size=self.batch_size)
+            Vehicle.objects.filter(pk=vehicle.pk).update(current_mileage=reading)
+            refresh_member_usage([log.pk for log in logs])
+        return len(entries)
@@ -0,0 +1,28 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from mileage_logs.ingest import bulk_ingest_entries
+
+
+class Command(BaseCommand):
+    help = "Bulk-loads mileage log entries and their seat claims from a JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON file containing a list of entries (see bulk_ingest_entries)")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path']) as f:
+                rows = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        try:
+            entries = bulk_ingest_entries(rows)
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+
+        log_count = len({entry.monthly_log_id for entry in entries})
+        self.stdout.write(self.style.SUCCESS(f"Ingested {len(entries)} entries into {log_count} monthly logs."))
@@ -0,0 +1,126 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import path, reverse
+
+from ___.urls import urlpatterns as project_urlpatterns
+from members.models import Member
+from members.views import MemberDetailView, MemberListView
+from mileage_logs.models import MonthlyMileageLog
+from mileage_logs.views import member_miles_view, monthly_log_summary_view
+from vehicles.views import VehicleListView
+
+
+class SyncURLConf:
+    """The project's URLs, with the report and list URLs routed to the synchronous versions of their views."""
+    urlpatterns = [
+        path('vehicles/', VehicleListView.as_view(), name="vehicle_list"),
+        path('members/', MemberListView.as_view(), name="member_list"),
+        path('members/<int:pk>/', MemberDetailView.as_view(), name="member_detail"),
+        path('mileage-logs/reports/monthly-logs/<int:pk>/', monthly_log_summary_view, name="monthly_log_summary"),
+        path('mileage-logs/reports/member-miles/', member_miles_view, name="member_miles_report"),
+        *project_urlpatterns,
+    ]
+
+
+async def asgi_get(app, host, path):
+    """Sends one GET request through the ASGI application; returns the response status."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', host.encode())], 'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    disconnected = asyncio.Event()
+    status = None
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a disconnect while the view runs; the client never leaves
+        await disconnected.wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_load(app, host, path, requests, concurrency):
+    """Sends requests GETs to path, concurrency at a time; returns (seconds, latencies, errors)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            if await asgi_get(app, host, path) != 200:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - started, latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of the async report and list views with their synchronous "
+        "versions, by sending concurrent requests through the ASGI application in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and variant")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once")
+        parser.add_argument(
+            '--cached', action='store_true',
+            help="Leave the cache enabled (by default it is disabled, so every request does its queries)",
+        )
+
+    def targets(self):
+        member = Member.objects.order_by('pk').first()
+        log = MonthlyMileageLog.objects.order_by('-year', '-month').first()
+        if member is None or log is None:
+            raise CommandError("Load test needs at least one member and one monthly log in the database.")
+        return [
+            ('vehicle list', 'vehicle_list', []),
+            ('member list', 'member_list', []),
+            ('member trips', 'member_detail', [member.pk]),
+            ('monthly summary', 'monthly_log_summary', [log.pk]),
+            ('member miles', 'member_miles_report', []),
+        ]
+
+    def handle(self, *args, **options):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        overrides = {'DEBUG': False}
+        if not options['cached']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        app = ASGIHandler()
+
+        with override_settings(**overrides):
+            targets = self.targets()
+            self.stdout.write(f"{'endpoint':<16} {'variant':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+            for label, name, args in targets:
+                for variant, urlconf in (('sync', SyncURLConf), ('async', settings.ROOT_URLCONF)):
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        url = reverse(name, args=args)
+                        seconds, latencies, errors = asyncio.run(
+                            run_load(app, host, url, options['requests'], options['concurrency'])
+                        )
+                    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+                    self.stdout.write(
+                        f"{label:<16} {variant:<6} {len(latencies) / seconds:>8.1f} "
+                        f"{statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} {errors:>6}"
+                    )
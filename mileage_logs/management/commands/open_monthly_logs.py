@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mileage_logs.months import parse_year_month
+from mileage_logs.rollover import open_monthly_logs
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens a month's mileage logs for every active vehicle that doesn't have one yet, "
+        "starting from the previous month's end reading. Safe to run more than once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Month to open (YYYY-MM); defaults to next month")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Logs inserted per INSERT statement")
+
+    def handle(self, *args, **options):
+        try:
+            year, month = parse_year_month(options['month']) if options['month'] else (None, None)
+        except ValueError as e:
+            raise CommandError(e)
+        logs = open_monthly_logs(year, month, batch_size=options['batch_size'])
+        if logs:
+            self.stdout.write(self.style.SUCCESS(f"Opened {len(logs)} monthly logs for {logs[0].year}-{logs[0].month:02d}."))
+        else:
+            self.stdout.write("Every active vehicle already has a log for that month.")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mileage_logs.models import MonthlyMileageLog, MemberMonthlyUsage
+from mileage_logs.recompute import refresh_member_usage
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-member monthly usage rollup from every mileage claim."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Monthly logs rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        log_ids = list(MonthlyMileageLog.objects.order_by('pk').values_list('pk', flat=True))
+        with transaction.atomic():
+            # Drops rows left behind for logs that no longer exist
+            MemberMonthlyUsage.objects.exclude(monthly_log__in=MonthlyMileageLog.objects.values('pk')).delete()
+
+        rows = 0
+        chunk_size = options['chunk_size']
+        for i in range(0, len(log_ids), chunk_size):
+            with transaction.atomic():
+                rows += refresh_member_usage(log_ids[i:i + chunk_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} usage rows for {len(log_ids)} monthly logs."))
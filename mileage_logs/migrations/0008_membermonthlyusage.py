@@ -0,0 +1,80 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:09
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum, Window
+
+BATCH_SIZE = 500
+
+
+def backfill_member_usage(apps, schema_editor):
+    # refresh_member_usage() reads vehicle, year and month off the entries, which only
+    # have them from 0010, so this builds the same rows from the logs instead
+    MonthlyMileageLog = apps.get_model('mileage_logs', 'MonthlyMileageLog')
+    MileageClaim = apps.get_model('mileage_logs', 'MileageClaim')
+    MemberMonthlyUsage = apps.get_model('mileage_logs', 'MemberMonthlyUsage')
+    db = schema_editor.connection.alias
+    log_ids = list(MonthlyMileageLog.objects.using(db).order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(log_ids), BATCH_SIZE):
+        claims = MileageClaim.objects.using(db).filter(mileage_log_entry__monthly_log__in=log_ids[i:i + BATCH_SIZE]).annotate(
+            total_seats=Window(Sum('number_of_seats_claimed'), partition_by=[F('mileage_log_entry')]),
+        ).order_by().values_list(
+            'member_id', 'mileage_log_entry__monthly_log_id', 'mileage_log_entry__monthly_log__vehicle_id',
+            'mileage_log_entry__monthly_log__year', 'mileage_log_entry__monthly_log__month',
+            'mileage_log_entry__distance_traveled', 'mileage_log_entry__is_long_distance',
+            'number_of_seats_claimed', 'total_seats',
+        )
+        usage = {}
+        for member_id, log_id, vehicle_id, year, month, distance, is_long_distance, seats, total_seats in claims:
+            row = usage.get((member_id, log_id))
+            if row is None:
+                row = usage[(member_id, log_id)] = MemberMonthlyUsage(
+                    member_id=member_id, monthly_log_id=log_id, vehicle_id=vehicle_id, year=year, month=month,
+                    trips=0, seat_miles=Decimal(0), long_distance_miles=Decimal(0), allocated_miles=Decimal(0),
+                )
+            seat_miles = (distance or 0) * seats
+            row.trips += 1
+            row.seat_miles += seat_miles
+            if is_long_distance:
+                row.long_distance_miles += seat_miles
+            row.allocated_miles += seat_miles / total_seats
+        for row in usage.values():
+            row.allocated_miles = row.allocated_miles.quantize(Decimal('0.01'))
+        MemberMonthlyUsage.objects.using(db).bulk_create(usage.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_alter_member_options_alter_memberalias_options_and_more'),
+        ('mileage_logs', '0007_alter_mileageclaim_number_of_seats_claimed'),
+        ('vehicles', '0003_alter_vehicle_current_mileage_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberMonthlyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField(choices=[(1, 'January'), (2, 'February'), (3, 'March'), (4, 'April'), (5, 'May'), (6, 'June'), (7, 'July'), (8, 'August'), (9, 'September'), (10, 'October'), (11, 'November'), (12, 'December')])),
+                ('trips', models.PositiveIntegerField(default=0, help_text='Number of trips the member claimed seats on')),
+                ('seat_miles', models.DecimalField(decimal_places=1, default=0, help_text='Sum of distance traveled times seats claimed', max_digits=12)),
+                ('long_distance_miles', models.DecimalField(decimal_places=1, default=0, help_text='Seat-miles on long distance trips', max_digits=12)),
+                ('allocated_miles', models.DecimalField(decimal_places=2, default=0, help_text='Seat-weighted share of the distance traveled (distance x seats / total seats)', max_digits=12)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_usage', to='members.member')),
+                ('monthly_log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_usage', to='mileage_logs.monthlymileagelog')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_usage', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Member Monthly Usage',
+                'verbose_name_plural': 'Member Monthly Usage',
+                'ordering': ['-year', '-month'],
+                'indexes': [models.Index(fields=['member', 'year', 'month'], name='mileage_log_member__eea3a8_idx')],
+                'unique_together': {('member', 'monthly_log')},
+            },
+        ),
+        migrations.RunPython(backfill_member_usage, migrations.RunPython.noop),
+    ]
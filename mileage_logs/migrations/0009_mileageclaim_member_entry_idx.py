@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0008_trigram_indexes'),
+        ('mileage_logs', '0008_membermonthlyusage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mileageclaim',
+            index=models.Index(fields=['member', 'mileage_log_entry'], name='claim_member_entry_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+import calendar
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_monthly_log_fields(apps, schema_editor):
+    MonthlyMileageLog = apps.get_model('mileage_logs', 'MonthlyMileageLog')
+    MileageLogEntry = apps.get_model('mileage_logs', 'MileageLogEntry')
+    log = MonthlyMileageLog.objects.filter(pk=OuterRef('monthly_log'))
+    MileageLogEntry.objects.using(schema_editor.connection.alias).update(
+        vehicle=Subquery(log.values('vehicle')[:1]),
+        year=Subquery(log.values('year')[:1]),
+        month=Subquery(log.values('month')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mileage_logs', '0009_mileageclaim_member_entry_idx'),
+        ('vehicles', '0004_vehicle_name_id_idx'),
+    ]
+
+    operations = [
+        # Added as nullable and filled in from the monthly logs; made required in 0011
+        migrations.AddField(
+            model_name='mileagelogentry',
+            name='vehicle',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='log_entries', to='vehicles.vehicle'),
+        ),
+        migrations.AddField(
+            model_name='mileagelogentry',
+            name='year',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mileagelogentry',
+            name='month',
+            field=models.IntegerField(choices=[(i, calendar.month_name[i]) for i in range(1, 13)], editable=False, null=True),
+        ),
+        migrations.RunPython(copy_monthly_log_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+import calendar
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mileage_logs', '0010_mileagelogentry_vehicle_year_month'),
+        ('vehicles', '0004_vehicle_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mileagelogentry',
+            options={'ordering': ['vehicle_id', 'year', 'month', 'entry_date', 'start_mileage'], 'verbose_name': 'Mileage Log Entry', 'verbose_name_plural': 'Mileage Log Entries'},
+        ),
+        migrations.AlterField(
+            model_name='mileagelogentry',
+            name='vehicle',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='log_entries', to='vehicles.vehicle'),
+        ),
+        migrations.AlterField(
+            model_name='mileagelogentry',
+            name='year',
+            field=models.IntegerField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='mileagelogentry',
+            name='month',
+            field=models.IntegerField(choices=[(i, calendar.month_name[i]) for i in range(1, 13)], editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='mileagelogentry',
+            index=models.Index(fields=['vehicle', 'year', 'month', 'entry_date', 'start_mileage'], name='entry_vehicle_order_idx'),
+        ),
+    ]
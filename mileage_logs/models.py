@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
@@ -46,6 +46,44 @@ class MonthlyMileageLog(models.Model):
     def __str__(self):
         return f"{self.vehicle.name} - {calendar.month_name[self.month]} {self.year} Log"
 
+    # Copied onto the log's entries and MemberMonthlyUsage rows; see save()
+    PLACEMENT_FIELDS = ('vehicle', 'year', 'month')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_placement = instance.placement()
+        return instance
+
+    def placement(self):
+        return (self.vehicle_id, self.year, self.month)
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the log. When an existing log moves to another vehicle or month, the copies of
+        vehicle, year and month on its entries are updated too, and the log's usage rollup
+        and both vehicles' current mileage are recomputed when the transaction commits.
+        """
+        from .recompute import schedule_recompute
+
+        update_fields = kwargs.get('update_fields')
+        moving = not self._state.adding and (update_fields is None or set(update_fields) & {
+            name for field in self.PLACEMENT_FIELDS for name in (field, f'{field}_id')
+        })
+        if moving:
+            stored = getattr(self, '_stored_placement', None)
+            if stored is None:
+                stored = MonthlyMileageLog.objects.filter(pk=self.pk).values_list('vehicle_id', 'year', 'month').first()
+            moving = stored is not None and stored != self.placement()
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if moving:
+                self.log_entries.update(vehicle=self.vehicle_id, year=self.year, month=self.month)
+                schedule_recompute(log_ids=[self.pk], vehicle_ids=[stored[0], self.vehicle_id], using=using)
+        self._stored_placement = self.placement()
+
     def clean(self):
         # Validate that end odometer reading is greater than or equal to start odometer reading
         if self.start_odometer_reading is not None and self.end_odometer_reading is not None:
@@ -97,6 +135,11 @@ class MileageLogEntry(models.Model):
         MonthlyMileageLog, on_delete=models.CASCADE, related_name='log_entries',
         help_text="The monthly log this trip belongs to"
     )
+    # Copied from the monthly log on save (and updated when the log changes), so entries
+    # can be ordered and filtered by vehicle and month without joining MonthlyMileageLog
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='log_entries', editable=False)
+    year = models.IntegerField(editable=False)
+    month = models.IntegerField(choices=[(i, calendar.month_name[i]) for i in range(1, 13)], editable=False)
     entry_date = models.DateField(help_text="Date of the trip (should be within the monthly log's month/year)")
     start_mileage = models.DecimalField(max_digits=10, decimal_places=0, help_text="Odometer reading at the start of the trip")
     end_mileage = models.DecimalField(max_digits=10, decimal_places=0, help_text="Odometer reading at the end of the trip")
@@ -122,7 +165,11 @@ class MileageLogEntry(models.Model):
         unique_together = ('monthly_log', 'entry_date', 'start_mileage')
         # This ordering is crucial for retrieving "previous" entries correctly
         # and for how entries are displayed by default.
-        ordering = ['monthly_log__vehicle', 'monthly_log__year', 'monthly_log__month', 'entry_date', 'start_mileage']
+        # vehicle_id rather than vehicle, which would join Vehicle to order by its name.
+        ordering = ['vehicle_id', 'year', 'month', 'entry_date', 'start_mileage']
+        indexes = [
+            models.Index(fields=['vehicle', 'year', 'month', 'entry_date', 'start_mileage'], name='entry_vehicle_order_idx'),
+        ]
 
 
     def clean(self):
@@ -144,7 +191,9 @@ class MileageLogEntry(models.Model):
                 )
 
         # 3. Enforce continuity with the previous entry (if one exists within the same monthly log)
-        if self.monthly_log_id and self.start_mileage is not None:
+        # Formsets validate all of their rows together in memory (see forms.MileageLogEntryInlineFormSet)
+        # and set _skip_continuity_check so each row doesn't query for its previous entry.
+        if self.monthly_log_id and self.start_mileage is not None and not getattr(self, '_skip_continuity_check', False):
             # Find the immediately preceding entry in the logical order
             # This query must be robust to correctly identify the "previous" entry
             # based on the defined ordering: monthly_log, entry_date, start_mileage.
@@ -174,37 +223,106 @@ class MileageLogEntry(models.Model):
 
 
 
+    # Denormalized from the monthly log; see copy_monthly_log_fields()
+    MONTHLY_LOG_FIELDS = ('vehicle', 'year', 'month')
+
+    def copy_monthly_log_fields(self):
+        """Copies the vehicle, year and month of the entry's monthly log onto the entry."""
+        if self.monthly_log_id is not None:
+            self.vehicle_id = self.monthly_log.vehicle_id
+            self.year = self.monthly_log.year
+            self.month = self.monthly_log.month
+
+    # What recomputations depend on; see stored_values() and save()
+    TRACKED_FIELDS = ('monthly_log_id', 'entry_date', 'start_mileage', 'end_mileage', 'distance_traveled', 'is_long_distance')
+
+    def stored_values(self, using=None):
+        """
+        Returns a dict of the entry's TRACKED_FIELDS as currently stored, plus its vehicle's
+        current_mileage, or None if it isn't stored. The entry's row (only) is locked until
+        the end of the transaction so no concurrent writer can change it in between (on
+        databases with SELECT ... FOR UPDATE).
+        """
+        if self.pk is None:
+            return None
+        return MileageLogEntry.objects.using(using or self._state.db).select_for_update(of=('self',)).filter(
+            pk=self.pk,
+        ).values(*self.TRACKED_FIELDS, current_mileage=models.F('vehicle__current_mileage')).first()
+
     def save(self, *args, **kwargs):
         """
-        Calculates distance_traveled before saving and updates related MonthlyMileageLog
-        and Vehicle's current_mileage.
+        Calculates distance_traveled before saving, adjusts the related MonthlyMileageLog's
+        total_distance_logged by the change in distance, and schedules what else depends on
+        the fields that changed to be recomputed when the transaction commits: the log's
+        end_odometer_reading, its MemberMonthlyUsage rows and the Vehicle's current_mileage
+        (unless the trip ends below it).
+
+        Every write is a single UPDATE relative to the stored values (total = total + delta,
+        current_mileage = GREATEST(current_mileage, ...)), and the delta is computed from
+        the entry's stored values read under a row lock, so concurrent saves never lose
+        each other's updates and only writers to the same entry or monthly log wait.
         """
+        from .recompute import apply_distance_delta, schedule_recompute
+
         # Calculate distance_traveled
         if self.start_mileage is not None and self.end_mileage is not None:
             self.distance_traveled = self.end_mileage - self.start_mileage
-        
-        super().save(*args, **kwargs)
-
-        # Update the MonthlyMileageLog's total_distance_logged
-        if self.monthly_log:
-            self.monthly_log.total_distance_logged = self.monthly_log.calculate_total_distance()
-
-            # Update the monthly log's end_odometer_reading if this is currently the latest entry for that month
-            latest_entry_for_month = self.monthly_log.log_entries.order_by('-entry_date', '-start_mileage').first()
-            if latest_entry_for_month and latest_entry_for_month.pk == self.pk: # Only update if this is truly the latest
-                self.monthly_log.end_odometer_reading = self.end_mileage
-                self.monthly_log.save(update_fields=['total_distance_logged', 'end_odometer_reading', 'updated_at'])
-            else:
-                self.monthly_log.save(update_fields=['total_distance_logged', 'updated_at'])
-
-        # Update the Vehicle's current_mileage based on the end_mileage of this entry,
-        # only if this entry's end_mileage is higher than the vehicle's current_mileage.
-        # This assumes new entries are mostly chronological and reflect higher mileage.
-        if self.monthly_log and self.monthly_log.vehicle:
-            if self.monthly_log.vehicle.current_mileage < self.end_mileage:
-                self.monthly_log.vehicle.current_mileage = self.end_mileage
-                self.monthly_log.vehicle.save(update_fields=['current_mileage', 'updated_at'])
-
+        self.copy_monthly_log_fields()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if update_fields & {'start_mileage', 'end_mileage', 'monthly_log'}:
+                update_fields.add('distance_traveled')
+            if 'monthly_log' in update_fields:
+                update_fields.update(self.MONTHLY_LOG_FIELDS)
+            # auto_now is only saved when listed; timelines' ETags depend on it
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
+        saving = set(self.TRACKED_FIELDS) if update_fields is None else {
+            field for field in self.TRACKED_FIELDS if field.removesuffix('_id') in update_fields
+        }
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        deltas = {}
+        with transaction.atomic(using=using, savepoint=False):
+            stored = self.stored_values(using) if saving else None
+            super().save(*args, **kwargs)
+            if not self.monthly_log:
+                return
+
+            if 'distance_traveled' in saving:
+                deltas[self.monthly_log_id] = self.distance_traveled or 0
+                if stored is not None:
+                    deltas[stored['monthly_log_id']] = deltas.get(stored['monthly_log_id'], 0) - (stored['distance_traveled'] or 0)
+            # Always in the same order, so two writers can't deadlock on each other's logs
+            for log_id in sorted(deltas):
+                apply_distance_delta(log_id, deltas[log_id], using=using)
+
+        changed = saving if stored is None else {field for field in saving if getattr(self, field) != stored[field]}
+        log_ids = {self.monthly_log_id} if stored is None else {self.monthly_log_id, stored['monthly_log_id']}
+        # A new entry has no claims yet; theirs refresh the usage rollup when they're saved
+        usage_changed = stored is not None and changed & {'monthly_log_id', 'distance_traveled', 'is_long_distance'}
+        if stored is not None and 'monthly_log_id' not in changed:
+            current_mileage = stored['current_mileage']
+        elif MonthlyMileageLog.vehicle.is_cached(self.monthly_log):
+            current_mileage = self.monthly_log.vehicle.current_mileage
+        else:
+            current_mileage = None
+        raises_mileage = changed & {'monthly_log_id', 'end_mileage'} and self.end_mileage is not None and (
+            current_mileage is None or self.end_mileage > current_mileage
+        )
+
+        # Saving many entries in one transaction (e.g. an admin formset) refreshes the
+        # MonthlyMileageLog's end_odometer_reading and the Vehicle's current_mileage once
+        # on commit rather than once per entry. The caches are invalidated on commit even
+        # when nothing needs recomputing.
+        schedule_recompute(
+            end_reading_log_ids=log_ids if changed & {'monthly_log_id', 'entry_date', 'start_mileage', 'end_mileage'} else (),
+            usage_log_ids=log_ids if usage_changed else (),
+            vehicle_ids=[self.vehicle_id] if raises_mileage else (),
+            using=using,
+        )
 
     def __str__(self):
         return f"{self.monthly_log.vehicle.name} - Trip on {self.entry_date}: {self.distance_traveled or 0} miles"
@@ -244,6 +362,10 @@ class MileageClaim(models.Model):
     class Meta:
         # Ensures that a member can only make one claim (for seats) per mileage entry.
         unique_together = ('mileage_log_entry', 'member')
+        indexes = [
+            # A member's claims, e.g. their trip history (the unique index leads with the entry)
+            models.Index(fields=['member', 'mileage_log_entry'], name='claim_member_entry_idx'),
+        ]
         verbose_name = "Mileage Claim"
         verbose_name_plural = "Mileage Claims"
         ordering = ['mileage_log_entry', 'member__name']
@@ -256,4 +378,42 @@ class MileageClaim(models.Model):
         # You could add validation here, e.g., to ensure total seats claimed don't exceed vehicle capacity
         # This would require accessing self.mileage_log_entry.monthly_log.vehicle.seat_capacity (if you add such a field)
         # However, checking *total* seats is often better done in the MileageLogEntry's clean method or form's clean method,
-        # after all claims have been potentially modified.
\ No newline at end of file
+        # after all claims have been potentially modified.
+
+# --- Reporting Rollup ---
+class MemberMonthlyUsage(models.Model):
+    """
+    Per-member, per-vehicle, per-month usage totals, derived from MileageClaims.
+    Rows are brought up to date for a monthly log whenever its entries or their claims
+    change, or the log moves to another vehicle or month (see recompute.refresh_member_usage),
+    and can be rebuilt with `manage.py rebuild_member_usage`.
+    """
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='monthly_usage')
+    monthly_log = models.ForeignKey(MonthlyMileageLog, on_delete=models.CASCADE, related_name='member_usage')
+    # Copied from the monthly log so per-member reports don't need a join
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='member_usage')
+    year = models.IntegerField()
+    month = models.IntegerField(choices=[(i, calendar.month_name[i]) for i in range(1, 13)])
+    trips = models.PositiveIntegerField(default=0, help_text="Number of trips the member claimed seats on")
+    seat_miles = models.DecimalField(
+        max_digits=12, decimal_places=1, default=0,
+        help_text="Sum of distance traveled times seats claimed"
+    )
+    long_distance_miles = models.DecimalField(
+        max_digits=12, decimal_places=1, default=0,
+        help_text="Seat-miles on long distance trips"
+    )
+    allocated_miles = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0,
+        help_text="Seat-weighted share of the distance traveled (distance x seats / total seats)"
+    )
+
+    class Meta:
+        unique_together = ('member', 'monthly_log')
+        indexes = [models.Index(fields=['member', 'year', 'month'])]
+        verbose_name = "Member Monthly Usage"
+        verbose_name_plural = "Member Monthly Usage"
+        ordering = ['-year', '-month']
+
+    def __str__(self):
+        return f"{self.member.name} - {self.vehicle.name} {calendar.month_name[self.month]} {self.year}"
@@ -0,0 +1,15 @@
+"""
+Parsing of months given as "YYYY-MM", shared by the management commands and the
+report views' query parameters.
+"""
+
+
+def parse_year_month(value):
+    """Parses "YYYY-MM" into a (year, month) pair. Raises ValueError if value isn't one."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise ValueError(f"Expected a month as YYYY-MM, got {value!r}")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month {value!r}")
+    return year, month
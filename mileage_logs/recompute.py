@@ -0,0 +1,275 @@
+"""
+Set-based recomputation of the denormalized fields derived from MileageLogEntries:
+MonthlyMileageLog.total_distance_logged, MonthlyMileageLog.end_odometer_reading and
+Vehicle.current_mileage.
+
+Each function issues a single UPDATE with correlated subqueries, so the number of
+queries stays the same however many logs or vehicles are affected.
+
+Day to day, total_distance_logged is maintained incrementally: saving or deleting an
+entry adjusts it by the change in distance with apply_distance_delta(), and only the
+end readings are refreshed when the transaction commits. schedule_recompute() records
+the logs and vehicles touched during a transaction and refreshes each of them exactly
+once on commit, from a single on_commit callback; a full SUM is only scheduled when the old distance isn't known.
+
+The MemberMonthlyUsage rollup is refreshed in the same flush for every monthly log
+whose entries or claims changed.
+
+All of this is safe under concurrent writers without table locks: totals only ever
+change by F() increments, Vehicle.current_mileage by GREATEST(), and a flush takes row
+locks on just the monthly logs it refreshes.
+"""
+import threading
+from decimal import Decimal
+
+from django.db import models, transaction, DEFAULT_DB_ALIAS
+from django.db.models import F, OuterRef, Subquery, Sum, Max, Window
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ___ import cache
+from vehicles.models import Vehicle
+from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim, MemberMonthlyUsage
+
+
+def _total_distance_subquery():
+    return Subquery(
+        MileageLogEntry.objects.filter(monthly_log=OuterRef('pk'))
+        .order_by()
+        .values('monthly_log')
+        .annotate(total_dist=Sum('distance_traveled'))
+        .values('total_dist')[:1],
+        output_field=models.DecimalField(max_digits=10, decimal_places=1),
+    )
+
+
+def _latest_end_mileage_subquery():
+    return Subquery(
+        MileageLogEntry.objects.filter(monthly_log=OuterRef('pk'))
+        .order_by('-entry_date', '-start_mileage')
+        .values('end_mileage')[:1],
+        output_field=models.DecimalField(max_digits=10, decimal_places=1),
+    )
+
+
+def recompute_monthly_logs(log_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Recomputes total_distance_logged and end_odometer_reading for the given logs.
+    The end reading is taken from the latest entry; a log without entries ends where it starts.
+    """
+    log_ids = set(log_ids)
+    if not log_ids:
+        return 0
+    return MonthlyMileageLog.objects.using(using).filter(pk__in=log_ids).update(
+        total_distance_logged=Coalesce(_total_distance_subquery(), models.Value(0), output_field=models.DecimalField(max_digits=10, decimal_places=1)),
+        end_odometer_reading=Coalesce(_latest_end_mileage_subquery(), F('start_odometer_reading')),
+        updated_at=timezone.now(),
+    )
+
+
+def refresh_end_readings(log_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Sets end_odometer_reading to the latest entry's end_mileage (or, once the last entry
+    is gone, to start_odometer_reading), leaving totals untouched.
+    """
+    log_ids = set(log_ids)
+    if not log_ids:
+        return 0
+    return MonthlyMileageLog.objects.using(using).filter(pk__in=log_ids).update(
+        end_odometer_reading=Coalesce(_latest_end_mileage_subquery(), F('start_odometer_reading')),
+        updated_at=timezone.now(),
+    )
+
+
+def apply_distance_delta(log_id, delta, using=DEFAULT_DB_ALIAS):
+    """Adjusts a log's total_distance_logged by delta in a single atomic UPDATE."""
+    if not delta:
+        return 0
+    return MonthlyMileageLog.objects.using(using).filter(pk=log_id).update(
+        total_distance_logged=F('total_distance_logged') + delta,
+        updated_at=timezone.now(),
+    )
+
+
+def recompute_vehicle_mileage(vehicle_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Raises Vehicle.current_mileage to the highest end_mileage logged for each vehicle.
+    Like MileageLogEntry.save(), this never lowers a vehicle's current mileage.
+    """
+    vehicle_ids = set(vehicle_ids)
+    if not vehicle_ids:
+        return 0
+    max_end_mileage = Subquery(
+        MileageLogEntry.objects.filter(vehicle=OuterRef('pk'))
+        .order_by()
+        .values('vehicle')
+        .annotate(max_end=Max('end_mileage'))
+        .values('max_end')[:1],
+        output_field=models.DecimalField(max_digits=10, decimal_places=1),
+    )
+    return Vehicle.objects.using(using).filter(pk__in=vehicle_ids).update(
+        current_mileage=Greatest(F('current_mileage'), Coalesce(max_end_mileage, F('current_mileage'))),
+        updated_at=timezone.now(),
+    )
+
+
+USAGE_FIELDS = ('vehicle_id', 'year', 'month', 'trips', 'seat_miles', 'long_distance_miles', 'allocated_miles')
+
+
+def refresh_member_usage(log_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Brings the MemberMonthlyUsage rows of the given monthly logs up to date with their
+    claims: one SELECT of the claims (with each trip's total seats from a window Sum) and
+    one of the current rows, then only the differences are written, with at most one
+    INSERT, one UPDATE and one DELETE. The rows take vehicle, year and month from the
+    entries, so they follow a log that moved (see MonthlyMileageLog.save()).
+    Returns the number of rows the logs now have.
+    """
+    log_ids = set(log_ids)
+    if not log_ids:
+        return 0
+    claims = MileageClaim.objects.using(using).filter(mileage_log_entry__monthly_log__in=log_ids).annotate(
+        total_seats=Window(Sum('number_of_seats_claimed'), partition_by=[F('mileage_log_entry')]),
+    ).order_by().values_list(
+        'member_id', 'mileage_log_entry__monthly_log_id', 'mileage_log_entry__vehicle_id',
+        'mileage_log_entry__year', 'mileage_log_entry__month',
+        'mileage_log_entry__distance_traveled', 'mileage_log_entry__is_long_distance',
+        'number_of_seats_claimed', 'total_seats',
+    )
+
+    usage = {}
+    for member_id, log_id, vehicle_id, year, month, distance, is_long_distance, seats, total_seats in claims:
+        row = usage.get((member_id, log_id))
+        if row is None:
+            row = usage[(member_id, log_id)] = MemberMonthlyUsage(
+                member_id=member_id, monthly_log_id=log_id, vehicle_id=vehicle_id, year=year, month=month,
+                trips=0, seat_miles=Decimal(0), long_distance_miles=Decimal(0), allocated_miles=Decimal(0),
+            )
+        seat_miles = (distance or 0) * seats
+        row.trips += 1
+        row.seat_miles += seat_miles
+        if is_long_distance:
+            row.long_distance_miles += seat_miles
+        row.allocated_miles += seat_miles / total_seats
+    for row in usage.values():
+        row.allocated_miles = row.allocated_miles.quantize(Decimal('0.01'))
+
+    existing = {
+        (row.member_id, row.monthly_log_id): row
+        for row in MemberMonthlyUsage.objects.using(using).filter(monthly_log__in=log_ids).order_by()
+    }
+    created, changed = [], []
+    for key, row in usage.items():
+        current = existing.pop(key, None)
+        if current is None:
+            created.append(row)
+        elif any(getattr(current, field) != getattr(row, field) for field in USAGE_FIELDS):
+            row.pk = current.pk
+            changed.append(row)
+    if existing:
+        MemberMonthlyUsage.objects.using(using).filter(pk__in=[row.pk for row in existing.values()]).delete()
+    if changed:
+        MemberMonthlyUsage.objects.using(using).bulk_update(changed, USAGE_FIELDS)
+    if created:
+        MemberMonthlyUsage.objects.using(using).bulk_create(created)
+    return len(usage)
+
+
+def lock_monthly_logs(log_ids, using=DEFAULT_DB_ALIAS):
+    """Locks the given logs' rows until the end of the transaction (where supported)."""
+    log_ids = set(log_ids)
+    if not log_ids:
+        return []
+    return list(
+        MonthlyMileageLog.objects.using(using).select_for_update().filter(pk__in=log_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+class _DirtySet:
+    """The monthly logs and vehicles awaiting recomputation on one database connection."""
+
+    def __init__(self):
+        self.log_ids = set()
+        self.end_reading_log_ids = set()
+        self.vehicle_ids = set()
+        self.usage_log_ids = set()
+        self.usage_entry_ids = set()
+        # The on_commit callback that will flush these ids, once one is registered
+        self.flush = None
+
+    def __bool__(self):
+        return bool(self.log_ids or self.end_reading_log_ids or self.vehicle_ids or self.usage_log_ids or self.usage_entry_ids)
+
+
+_local = threading.local()
+
+
+def _dirty_set(using):
+    if not hasattr(_local, 'dirty_sets'):
+        _local.dirty_sets = {}
+    return _local.dirty_sets.setdefault(using, _DirtySet())
+
+
+def flush_recompute(using=DEFAULT_DB_ALIAS):
+    """
+    Recomputes everything scheduled on the given connection, clears the dirty set and
+    invalidates the caches that depend on entries (even if nothing needed recomputing).
+    """
+    dirty = _dirty_set(using)
+    _local.dirty_sets[using] = _DirtySet()
+    if dirty:
+        _recompute(dirty, using)
+    # The updates don't send signals
+    cache.invalidate(cache.MILEAGE_LOGS, cache.VEHICLES, cache.REPORTS)
+
+
+def _recompute(dirty, using):
+    with transaction.atomic(using=using):
+        usage_log_ids = dirty.log_ids | dirty.usage_log_ids
+        if dirty.usage_entry_ids:
+            usage_log_ids.update(
+                MileageLogEntry.objects.using(using).filter(pk__in=dirty.usage_entry_ids)
+                .order_by().values_list('monthly_log_id', flat=True).distinct()
+            )
+        # Lock the logs (in pk order, so concurrent flushes can't deadlock) before reading
+        # their entries: the statements below then see every transaction that committed
+        # before the lock was granted, and two flushes of the same log can't interleave
+        # their usage DELETE/INSERTs. Vehicles need no lock, since GREATEST() only rises.
+        lock_monthly_logs(usage_log_ids | dirty.end_reading_log_ids, using=using)
+        recompute_monthly_logs(dirty.log_ids, using=using)
+        refresh_end_readings(dirty.end_reading_log_ids - dirty.log_ids, using=using)
+        recompute_vehicle_mileage(dirty.vehicle_ids, using=using)
+        refresh_member_usage(usage_log_ids, using=using)
+
+
+def schedule_recompute(log_ids=(), vehicle_ids=(), end_reading_log_ids=(), usage_log_ids=(), usage_entry_ids=(),
+                       using=DEFAULT_DB_ALIAS):
+    """
+    Marks monthly logs and vehicles as needing recomputation once the current transaction
+    commits. Outside of a transaction the recomputation happens immediately.
+
+    log_ids get a full recompute of their totals and end readings, and of their
+    MemberMonthlyUsage rows; end_reading_log_ids, whose totals were already adjusted
+    incrementally, only get their end readings refreshed. usage_log_ids and the logs of
+    usage_entry_ids (entries whose claims changed) get their MemberMonthlyUsage rows
+    refreshed. Calling it with nothing to recompute still invalidates the caches on commit.
+
+    The first call in a transaction registers a single on_commit callback that flushes the
+    whole dirty set. If that callback has since been discarded, because the transaction or
+    the savepoint that registered it was rolled back, so are the ids recorded since.
+    """
+    dirty = _dirty_set(using)
+    if dirty.flush is not None and not any(
+        func is dirty.flush for sids, func, robust in transaction.get_connection(using).run_on_commit
+    ):
+        dirty = _local.dirty_sets[using] = _DirtySet()
+    dirty.log_ids.update(pk for pk in log_ids if pk is not None)
+    dirty.end_reading_log_ids.update(pk for pk in end_reading_log_ids if pk is not None)
+    dirty.usage_log_ids.update(pk for pk in usage_log_ids if pk is not None)
+    dirty.vehicle_ids.update(pk for pk in vehicle_ids if pk is not None)
+    dirty.usage_entry_ids.update(pk for pk in usage_entry_ids if pk is not None)
+    if dirty.flush is None:
+        # flush_recompute() starts a new dirty set, so the next transaction registers its own
+        dirty.flush = lambda: flush_recompute(using)
+        transaction.on_commit(dirty.flush, using=using)
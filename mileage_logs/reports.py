@@ -0,0 +1,79 @@
+"""
+Cached report data for monthly logs and members.
+
+Results are cached per namespace (see ___.cache) and recomputed after the underlying
+logs, entries, claims, vehicles or members change. Each report has an async version for
+the async views, built on the async ORM and cache APIs.
+"""
+from django.db.models import Count, Q, Sum
+
+from ___ import cache
+from .allocation import aallocate_member_miles, allocate_member_miles
+from .models import MonthlyMileageLog, MileageLogEntry, MemberMonthlyUsage
+
+USAGE_FIELDS = ('member_id', 'member__name', 'trips', 'seat_miles', 'long_distance_miles', 'allocated_miles')
+
+
+def _summary_queries(log_id):
+    # The log and its entry stats come from one annotated query, the usage rows from another
+    log = MonthlyMileageLog.objects.select_related('vehicle').annotate(
+        entry_count=Count('log_entries'),
+        long_distance_miles=Sum('log_entries__distance_traveled', filter=Q(log_entries__is_long_distance=True), default=0),
+    )
+    usage = MemberMonthlyUsage.objects.filter(monthly_log_id=log_id).order_by('member__name').values(*USAGE_FIELDS)
+    return log, usage
+
+
+def _summary(log, members):
+    return {
+        'id': log.pk,
+        'vehicle': log.vehicle.name,
+        'year': log.year,
+        'month': log.month,
+        'start_odometer_reading': log.start_odometer_reading,
+        'end_odometer_reading': log.end_odometer_reading,
+        'total_distance_logged': log.total_distance_logged,
+        'entry_count': log.entry_count,
+        'long_distance_miles': log.long_distance_miles,
+        'members': members,
+    }
+
+
+def _monthly_log_summary(log_id):
+    log, usage = _summary_queries(log_id)
+    return _summary(log.get(pk=log_id), list(usage))
+
+
+async def _amonthly_log_summary(log_id):
+    log, usage = _summary_queries(log_id)
+    log = await log.aget(pk=log_id)
+    return _summary(log, [row async for row in usage])
+
+
+def monthly_log_summary(log_id):
+    """
+    Totals, entry count, long-distance miles and per-member usage for one MonthlyMileageLog.
+    Raises MonthlyMileageLog.DoesNotExist for an unknown id.
+    """
+    return cache.cached(cache.MILEAGE_LOGS, ['log_summary', log_id], lambda: _monthly_log_summary(log_id))
+
+
+async def amonthly_log_summary(log_id):
+    """Async version of monthly_log_summary()."""
+    return await cache.acached(cache.MILEAGE_LOGS, ['log_summary', log_id], lambda: _amonthly_log_summary(log_id))
+
+
+def member_miles_report(start=None, end=None, vehicle_id=None):
+    """Cached allocate_member_miles() for a range of (year, month) tuples and an optional vehicle id."""
+    return cache.cached(
+        cache.REPORTS, ['member_miles', start, end, vehicle_id],
+        lambda: allocate_member_miles(start, end, vehicle_id),
+    )
+
+
+async def amember_miles_report(start=None, end=None, vehicle_id=None):
+    """Async version of member_miles_report()."""
+    return await cache.acached(
+        cache.REPORTS, ['member_miles', start, end, vehicle_id],
+        lambda: aallocate_member_miles(start, end, vehicle_id),
+    )
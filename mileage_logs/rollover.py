@@ -0,0 +1,69 @@
+"""
+Month rollover: opening the next month's MonthlyMileageLog for every active vehicle.
+
+Each new log starts where the vehicle's log for the month before ended (its
+end_odometer_reading), or at Vehicle.current_mileage when there is no such log. Until
+trips are logged the end reading equals the start reading.
+
+The vehicles still missing a log for the month are read in one query, with the previous
+month's end reading fetched by a correlated subquery, and the logs are inserted with
+bulk_create(ignore_conflicts=True). Running the rollover twice, or in two processes at
+once, is harmless: the ('vehicle', 'year', 'month') unique constraint drops the
+duplicates.
+"""
+from django.db import models, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ___ import cache
+from vehicles.models import Vehicle
+from .models import MonthlyMileageLog
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def open_monthly_logs(year=None, month=None, batch_size=1000, using=DEFAULT_DB_ALIAS):
+    """
+    Creates the monthly logs for year/month (by default next month) for every active
+    vehicle that doesn't have one yet, seeded from the previous month's end reading.
+    Returns the list of logs inserted (without primary keys, as bulk_create() can't
+    return them with ignore_conflicts); a log another process created at the same
+    moment is skipped by the database but may still be listed.
+    """
+    if year is None or month is None:
+        today = timezone.localdate()
+        year, month = next_month(today.year, today.month)
+    previous_year, previous_month_number = previous_month(year, month)
+
+    previous_end = MonthlyMileageLog.objects.filter(
+        vehicle=OuterRef('pk'), year=previous_year, month=previous_month_number,
+    ).values('end_odometer_reading')[:1]
+    vehicles = Vehicle.objects.using(using).filter(is_active=True).exclude(
+        Exists(MonthlyMileageLog.objects.filter(vehicle=OuterRef('pk'), year=year, month=month))
+    ).annotate(
+        start_reading=Coalesce(
+            Subquery(previous_end), 'current_mileage',
+            output_field=models.DecimalField(max_digits=10, decimal_places=1),
+        ),
+    ).order_by('pk').values_list('pk', 'start_reading')
+
+    logs = [
+        MonthlyMileageLog(
+            vehicle_id=vehicle_id, year=year, month=month,
+            start_odometer_reading=start_reading, end_odometer_reading=start_reading,
+        )
+        for vehicle_id, start_reading in vehicles
+    ]
+    if logs:
+        with transaction.atomic(using=using):
+            MonthlyMileageLog.objects.using(using).bulk_create(logs, batch_size=batch_size, ignore_conflicts=True)
+            # bulk_create() doesn't send the post_save signal that invalidates caches
+            cache.invalidate_on_commit(cache.MILEAGE_LOGS, cache.VEHICLES, cache.REPORTS, using=using)
+    return logs
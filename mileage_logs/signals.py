@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ___ import cache
+from vehicles.models import Vehicle
+from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim
+from .recompute import apply_distance_delta, schedule_recompute
+
+
+def _deleting_log(origin):
+    return isinstance(origin, (MonthlyMileageLog, Vehicle)) or getattr(origin, 'model', None) in (MonthlyMileageLog, Vehicle)
+
+
+@receiver(pre_delete, sender=MileageLogEntry)
+def subtract_deleted_entry(sender, instance, using, origin=None, **kwargs):
+    """
+    Keeps the MonthlyMileageLog's totals correct when an entry is deleted, whether directly,
+    through a queryset or by the admin. Skipped when the log itself is being deleted.
+
+    Runs before the delete (inside its transaction) so it can subtract the distance that is
+    actually stored, read under a row lock, rather than the instance's possibly stale copy.
+    """
+    if _deleting_log(origin):
+        return
+    stored = instance.stored_values(using)
+    if stored is not None:
+        apply_distance_delta(stored['monthly_log_id'], -(stored['distance_traveled'] or 0), using=using)
+        instance._deleted_from_log_id = stored['monthly_log_id']
+
+
+@receiver(post_delete, sender=MileageLogEntry)
+def refresh_after_deleted_entry(sender, instance, using, origin=None, **kwargs):
+    if _deleting_log(origin):
+        return
+    log_id = getattr(instance, '_deleted_from_log_id', instance.monthly_log_id)
+    schedule_recompute(end_reading_log_ids=[log_id], usage_log_ids=[log_id], using=using)
+
+
+@receiver(post_save, sender=MileageClaim)
+@receiver(post_delete, sender=MileageClaim)
+def refresh_usage_for_claim(sender, instance, using, **kwargs):
+    """Refreshes the MemberMonthlyUsage rollup of the claim's monthly log on commit."""
+    schedule_recompute(usage_entry_ids=[instance.mileage_log_entry_id], using=using)
+
+
+@receiver(post_save, sender=MonthlyMileageLog)
+@receiver(post_delete, sender=MonthlyMileageLog)
+def invalidate_mileage_caches(sender, using, **kwargs):
+    # Entry and claim changes are invalidated by the recompute flush they schedule
+    cache.invalidate_on_commit(cache.MILEAGE_LOGS, cache.VEHICLES, cache.REPORTS, using=using)
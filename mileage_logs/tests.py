@@ -1,3 +1,1032 @@
-from django.test import TestCase
+import datetime
+import re
+import tempfile
+import threading
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.forms import inlineformset_factory
+from django.test import RequestFactory, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from members.models import Member, MemberAlias
+from vehicles.models import Vehicle
+from .allocation import allocate_member_miles
+from .audit import audit_monthly_logs
+from .management.commands.benchmark import compare as compare_benchmarks
+from .continuity import continuity_breaks, month_boundary_breaks
+from .forms import MileageLogEntryInlineFormSet
+from . import exports, views
+from .ingest import bulk_ingest_entries
+from .models import MonthlyMileageLog, MileageLogEntry, MileageClaim, MemberMonthlyUsage
+from .recompute import refresh_member_usage, schedule_recompute
+from .rollover import open_monthly_logs
+
+
+def make_rows(monthly_log, count, start=1000, members=("Alice",)):
+    rows = []
+    for i in range(count):
+        rows.append({
+            'monthly_log': monthly_log.pk,
+            # Non-decreasing dates, so the readings stay continuous
+            'entry_date': datetime.date(monthly_log.year, monthly_log.month, 1 + i * 28 // max(count, 28)),
+            'start_mileage': start + i * 10,
+            'end_mileage': start + i * 10 + 10,
+            'claims': [{'member': name} for name in members],
+        })
+    return rows
+
+
+class BulkIngestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        # Committed, as far as the member resolver is concerned (see members.signals)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.alice = Member.objects.create(name="Alice", email="alice@example.com")
+            cls.bob = Member.objects.create(name="Bob", email="bob@example.com")
+            MemberAlias.objects.create(name="B.", member=cls.bob)
+
+    def make_log(self, month):
+        return MonthlyMileageLog.objects.create(
+            vehicle=self.vehicle, year=2024, month=month,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+
+    def test_ingest_updates_derived_fields(self):
+        log = self.make_log(5)
+        bulk_ingest_entries(make_rows(log, 20, members=("Alice", "B.")))
+
+        log.refresh_from_db()
+        self.vehicle.refresh_from_db()
+        self.assertEqual(log.log_entries.count(), 20)
+        self.assertEqual(MileageClaim.objects.filter(member=self.bob).count(), 20)
+        self.assertEqual(log.total_distance_logged, Decimal(200))
+        self.assertEqual(log.end_odometer_reading, Decimal(1200))
+        self.assertEqual(self.vehicle.current_mileage, Decimal(1200))
+
+    def test_query_count_is_flat(self):
+        counts = []
+        for month, size in ((1, 5), (2, 25), (3, 50)):
+            rows = make_rows(self.make_log(month), size, members=("Alice", "Bob"))
+            with CaptureQueriesContext(connection) as ctx:
+                bulk_ingest_entries(rows)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_invalid_rows_write_nothing(self):
+        log = self.make_log(6)
+        rows = make_rows(log, 3)
+        rows[1]['end_mileage'] = 0
+        rows[2]['claims'] = [{'member': "Nobody"}]
+        with self.assertRaises(ValidationError) as ctx:
+            bulk_ingest_entries(rows)
+        self.assertEqual(len(ctx.exception.messages), 2)
+        self.assertFalse(MileageLogEntry.objects.exists())
+
+    def test_batches_are_checked_against_stored_entries(self):
+        log = self.make_log(6)
+        bulk_ingest_entries(make_rows(log, 2))  # 1000-1010 on the 1st, 1010-1020 on the 2nd
+        rows = [
+            {'monthly_log': log.pk, 'entry_date': '2024-06-02', 'start_mileage': 1010, 'end_mileage': 1020},
+            {'monthly_log': log.pk, 'entry_date': '2024-06-03', 'start_mileage': 1025, 'end_mileage': 1030},
+            {'monthly_log': log.pk, 'entry_date': '2024-06-04', 'start_mileage': 1030, 'end_mileage': 1040},
+        ]
+        with self.assertRaises(ValidationError) as ctx:
+            bulk_ingest_entries(rows)
+        self.assertEqual(ctx.exception.messages, [
+            "Row 1: another entry of the log already starts at this mileage on this date",
+            "Row 2: start mileage must match the previous entry's end mileage (1020)",
+        ])
+
+        rows = [{**rows[2], 'start_mileage': 1020, 'claims': [{'member': "Alice", 'seats': True}]}]
+        with self.assertRaisesMessage(ValidationError, "invalid number of seats True"):
+            bulk_ingest_entries(rows)
+        self.assertEqual(MileageLogEntry.objects.count(), 2)
+
+    def test_conflicting_writes_raise_validation_errors(self):
+        rows = make_rows(self.make_log(7), 2)
+        with mock.patch.object(MileageClaim.objects, 'bulk_create', side_effect=IntegrityError("UNIQUE constraint failed")):
+            with self.assertRaisesMessage(ValidationError, "conflict with changes saved meanwhile"):
+                bulk_ingest_entries(rows)
+        self.assertFalse(MileageLogEntry.objects.exists())
+
+
+class RecomputeSchedulingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=5,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+
+    def test_many_saves_recompute_once_on_commit(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for i in range(100):
+                        MileageLogEntry.objects.create(
+                            monthly_log=self.log, entry_date=datetime.date(2024, 5, 1 + i // 4),
+                            start_mileage=1000 + i * 10, end_mileage=1010 + i * 10,
+                        )
+                    self.log.refresh_from_db()
+                    self.assertEqual(self.log.end_odometer_reading, Decimal(1000))
+
+        recomputes = [q for q in ctx.captured_queries if 'SET "end_odometer_reading"' in q['sql']]
+        self.assertEqual(len(recomputes), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'SUM("mileage_logs_mileagelogentry"."distance_traveled")' in q['sql']])
+        self.log.refresh_from_db()
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.log.total_distance_logged, Decimal(1000))
+        self.assertEqual(self.log.end_odometer_reading, Decimal(2000))
+        self.assertEqual(self.vehicle.current_mileage, Decimal(2000))
+
+    def test_one_flush_is_registered_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(3):
+                schedule_recompute(log_ids=[self.log.pk], vehicle_ids=[self.vehicle.pk])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_rolled_back_ids_are_not_flushed(self):
+        other = Vehicle.objects.create(name="Bus", year=2020, make="Ford", model="E-450")
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                schedule_recompute(log_ids=[self.log.pk], vehicle_ids=[self.vehicle.pk])
+                raise DatabaseError
+            schedule_recompute(vehicle_ids=[other.pk])
+        self.assertEqual(len(callbacks), 1)
+        with mock.patch('mileage_logs.recompute.recompute_monthly_logs') as logs, \
+                mock.patch('mileage_logs.recompute.recompute_vehicle_mileage') as vehicles:
+            callbacks[0]()
+        logs.assert_called_once_with(set(), using='default')
+        vehicles.assert_called_once_with({other.pk}, using='default')
+
+
+class IncrementalTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.may = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=5,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        cls.june = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=6,
+            start_odometer_reading=1030, end_odometer_reading=1030,
+        )
+
+    def create_entry(self, day, start, end, monthly_log=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MileageLogEntry.objects.create(
+                monthly_log=monthly_log or self.may, entry_date=datetime.date(2024, 5, day),
+                start_mileage=start, end_mileage=end,
+            )
+
+    def assertLog(self, log, total, end):
+        log.refresh_from_db()
+        self.assertEqual(log.total_distance_logged, Decimal(total))
+        self.assertEqual(log.end_odometer_reading, Decimal(end))
+
+    def test_edit_adjusts_by_delta(self):
+        self.create_entry(1, 1000, 1010)
+        self.create_entry(2, 1010, 1030)
+        entry = MileageLogEntry.objects.get(entry_date=datetime.date(2024, 5, 2))
+        entry.end_mileage = 1025
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'SUM("mileage_logs_mileagelogentry"."distance_traveled")' in q['sql']])
+        self.assertLog(self.may, 25, 1025)
+
+    def test_delete_updates_totals(self):
+        self.create_entry(1, 1000, 1010)
+        last = self.create_entry(2, 1010, 1030)
+        with self.captureOnCommitCallbacks(execute=True):
+            last.delete()
+        self.assertLog(self.may, 10, 1010)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MileageLogEntry.objects.all().delete()
+        self.assertLog(self.may, 0, 1000)
+        self.may.validate_checksum()
+
+    def test_deltas_come_from_the_stored_distance(self):
+        self.create_entry(1, 1000, 1010)
+        # A deferred instance, and two copies of the same entry edited one after the other
+        deferred = MileageLogEntry.objects.only('monthly_log', 'entry_date', 'start_mileage', 'end_mileage').get()
+        first, second = MileageLogEntry.objects.get(), MileageLogEntry.objects.get()
+        for entry, end in [(deferred, 1020), (first, 1015), (second, 1012)]:
+            entry.end_mileage = end
+            with self.captureOnCommitCallbacks(execute=True):
+                entry.save()
+        self.assertLog(self.may, 12, 1012)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertLog(self.may, 0, 1000)
+
+    def test_update_fields(self):
+        entry = self.create_entry(1, 1000, 1010)
+        entry.end_mileage = 1020
+        entry.purpose = "Groceries"
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save(update_fields=['purpose'])
+        self.assertLog(self.may, 10, 1010)
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save(update_fields=['end_mileage'])
+        self.assertLog(self.may, 20, 1020)
+
+    def test_saves_only_recompute_what_changed(self):
+        self.create_entry(1, 1000, 1010)
+        entry = MileageLogEntry.objects.select_related('monthly_log').get()
+        # The stored values (under the row lock) and the UPDATE
+        entry.purpose = "Groceries"
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        # Also the total, and on commit the log's lock, end reading and usage rollup; the
+        # trip ends below the vehicle's current mileage, which is left alone
+        entry.end_mileage = 1005
+        with self.assertNumQueries(9), self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertLog(self.may, 5, 1005)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.current_mileage, 1010)
+        # A trip past it raises it
+        entry.end_mileage = 1020
+        with self.assertNumQueries(10), self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.current_mileage, 1020)
+
+    # ConcurrentWriteTests needs row locks; these check the same logic on any database
+
+    def test_moves_take_the_stored_distance_off_the_old_log(self):
+        entry = self.create_entry(1, 1000, 1010)
+        stale = MileageLogEntry.objects.get()
+        entry.end_mileage = 1020
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        stale.monthly_log = self.june
+        stale.start_mileage, stale.end_mileage = 1030, 1045
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.save()
+        self.assertLog(self.may, 0, 1000)
+        self.assertLog(self.june, 15, 1045)
+
+    def test_rows_are_locked_before_they_are_read(self):
+        entry = self.create_entry(1, 1000, 1010)
+        entry.monthly_log = self.june
+        entry.start_mileage, entry.end_mileage = 1030, 1040
+        log_table = MonthlyMileageLog._meta.db_table
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as locks:
+            with CaptureQueriesContext(connection) as saving, self.captureOnCommitCallbacks() as callbacks:
+                entry.save()
+            with CaptureQueriesContext(connection) as flushing:
+                for callback in callbacks:
+                    callback()
+        self.assertEqual([call.args[0].model for call in locks.call_args_list], [MileageLogEntry, MonthlyMileageLog])
+
+        # The entry's stored distance is read (under the lock) before it's overwritten, and
+        # the two logs' totals are then adjusted in pk order, whatever the direction of the move
+        statements = [q['sql'] for q in saving.captured_queries]
+        self.assertTrue(statements[0].startswith('SELECT'))
+        self.assertIn(f'"{MileageLogEntry._meta.db_table}"."id" = {entry.pk}', statements[0])
+        self.assertTrue(statements[1].startswith(f'UPDATE "{MileageLogEntry._meta.db_table}"'))
+        self.assertEqual(
+            [int(re.search(r'"id" = (\d+)', sql)[1]) for sql in statements if sql.startswith(f'UPDATE "{log_table}"')],
+            sorted([self.may.pk, self.june.pk]),
+        )
+
+        # The flush locks both logs, in pk order, before recomputing anything
+        statements = [q['sql'] for q in flushing.captured_queries]
+        lock = next(i for i, sql in enumerate(statements) if sql.startswith(f'SELECT "{log_table}"."id"'))
+        self.assertTrue(statements[lock].endswith(f'ORDER BY "{log_table}"."id" ASC'))
+        self.assertFalse([sql for sql in statements[:lock] if not sql.startswith(('SAVEPOINT', 'SELECT DISTINCT "mileage_logs_mileagelogentry"."monthly_log_id"'))])
+        self.assertLog(self.may, 0, 1000)
+        self.assertLog(self.june, 10, 1040)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentWriteTests(TransactionTestCase):
+    """Parallel writers on one monthly log and vehicle; needs a database with row locks."""
+    threads = 8
+    entries_per_thread = 10
+
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        self.log = MonthlyMileageLog.objects.create(
+            vehicle=self.vehicle, year=2024, month=5, start_odometer_reading=0, end_odometer_reading=0,
+        )
+        self.member = Member.objects.create(name="Alice", email="alice@example.com")
+
+    def write(self, thread):
+        try:
+            self.barrier.wait()
+            for i in range(self.entries_per_thread):
+                start = (thread * self.entries_per_thread + i) * 10
+                with transaction.atomic():
+                    entry = MileageLogEntry.objects.create(
+                        monthly_log=self.log, entry_date=datetime.date(2024, 5, 1 + thread),
+                        start_mileage=start, end_mileage=start + 5,
+                    )
+                    MileageClaim.objects.create(mileage_log_entry=entry, member=self.member)
+                # Every entry is then lengthened by another writer's copy of it
+                with transaction.atomic():
+                    copy = MileageLogEntry.objects.get(pk=entry.pk)
+                    copy.end_mileage = start + 10
+                    copy.save()
+        finally:
+            connection.close()
+
+    def test_parallel_writers_lose_no_updates(self):
+        self.barrier = threading.Barrier(self.threads)
+        workers = [threading.Thread(target=self.write, args=(thread,)) for thread in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        count = self.threads * self.entries_per_thread
+        self.log.refresh_from_db()
+        self.vehicle.refresh_from_db()
+        self.assertEqual(MileageLogEntry.objects.count(), count)
+        self.assertEqual(self.log.total_distance_logged, count * 10)
+        self.assertEqual(self.log.end_odometer_reading, count * 10)
+        self.assertEqual(self.vehicle.current_mileage, count * 10)
+        self.assertEqual(
+            list(MemberMonthlyUsage.objects.values_list('trips', 'seat_miles')), [(count, count * 10)],
+        )
+
+
+class DenormalizedEntryFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.van = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.bus = Vehicle.objects.create(name="Bus", year=2020, make="Ford", model="E-450")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=cls.van, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(cls.log, 3, members=()))
+        with cls.captureOnCommitCallbacks(execute=True):
+            MileageLogEntry.objects.create(
+                monthly_log=cls.log, entry_date=datetime.date(2024, 5, 20), start_mileage=1030, end_mileage=1040,
+            )
+
+    def test_fields_follow_the_monthly_log(self):
+        self.assertEqual(
+            set(MileageLogEntry.objects.values_list('vehicle', 'year', 'month')), {(self.van.pk, 2024, 5)},
+        )
+        self.log.vehicle = self.bus
+        self.log.month = 6
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log.save()
+        self.assertEqual(
+            set(MileageLogEntry.objects.values_list('vehicle', 'year', 'month')), {(self.bus.pk, 2024, 6)},
+        )
+        self.bus.refresh_from_db()
+        self.assertEqual(self.bus.current_mileage, 1040)
+
+    def test_saves_that_dont_move_the_log_leave_entries_alone(self):
+        log = MonthlyMileageLog.objects.get(pk=self.log.pk)
+        log.end_odometer_reading = 1040
+        # One UPDATE each, and only the caches' invalidation on commit: no recompute
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks() as callbacks:
+            log.save()
+            log.save(update_fields=['end_odometer_reading'])
+        self.assertEqual(len(callbacks), 2)
+
+    def test_vehicle_history_needs_no_join_or_sort(self):
+        history = MileageLogEntry.objects.filter(vehicle=self.van)
+        self.assertNotIn('JOIN', str(history.query))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # The test tables are tiny, which would otherwise make a sequential scan cheaper
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = history.explain()
+        self.assertIn('entry_vehicle_order_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan.upper())
+        self.assertNotIn('Sort', plan)
+
+
+class ContinuityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=5,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        next_log = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=6,
+            start_odometer_reading=1045, end_odometer_reading=1045,
+        )
+        # A break bulk_ingest_entries() would refuse, written directly
+        MileageLogEntry.objects.bulk_create([
+            MileageLogEntry(
+                monthly_log=cls.log, vehicle=cls.vehicle, year=2024, month=5, entry_date=datetime.date(2024, 5, day),
+                start_mileage=start, end_mileage=end, distance_traveled=end - start,
+            )
+            for day, start, end in ((1, 1000, 1010), (2, 1012, 1020), (3, 1020, 1040))
+        ])
+        bulk_ingest_entries([
+            {'monthly_log': next_log.pk, 'entry_date': '2024-06-01', 'start_mileage': 1045, 'end_mileage': 1050},
+        ])
+
+    def test_breaks_reported_in_one_query(self):
+        with self.assertNumQueries(1):
+            breaks = continuity_breaks()
+        self.assertEqual([(b['start_mileage'], b['previous_end_mileage']) for b in breaks], [(1012, 1010)])
+
+        breaks = continuity_breaks(MileageLogEntry.objects.filter(monthly_log__vehicle=self.vehicle), per_vehicle=True)
+        self.assertEqual([(b['start_mileage'], b['previous_end_mileage']) for b in breaks], [(1012, 1010), (1045, 1040)])
+
+    def test_formset_validates_submitted_rows_together(self):
+        FormSet = inlineformset_factory(
+            MonthlyMileageLog, MileageLogEntry, formset=MileageLogEntryInlineFormSet,
+            fields=('entry_date', 'start_mileage', 'end_mileage'), extra=1,
+        )
+        entries = list(self.log.log_entries.order_by('entry_date'))
+        data = {
+            'log_entries-TOTAL_FORMS': '4', 'log_entries-INITIAL_FORMS': '3',
+            'log_entries-MIN_NUM_FORMS': '0', 'log_entries-MAX_NUM_FORMS': '1000',
+        }
+        rows = [('2024-05-01', 1000, 1012), ('2024-05-02', 1012, 1020), ('2024-05-03', 1020, 1040), ('2024-05-04', 1041, 1050)]
+        for i, (day, start, end) in enumerate(rows):
+            data.update({
+                f'log_entries-{i}-id': str(entries[i].pk) if i < 3 else '',
+                f'log_entries-{i}-monthly_log': str(self.log.pk),
+                f'log_entries-{i}-entry_date': day,
+                f'log_entries-{i}-start_mileage': str(start),
+                f'log_entries-{i}-end_mileage': str(end),
+            })
+
+        with CaptureQueriesContext(connection) as ctx:
+            formset = FormSet(data, instance=self.log)
+            self.assertFalse(formset.is_valid())
+        # No per-row "previous entry" lookups.
+        self.assertFalse([q for q in ctx.captured_queries if '"start_mileage" <' in q['sql']])
+        self.assertEqual([bool(form.errors) for form in formset.forms], [False, False, False, True])
+
+        data['log_entries-3-start_mileage'] = '1040'
+        self.assertTrue(FormSet(data, instance=self.log).is_valid())
+
+
+class AuditTests(TestCase):
+    def test_reports_every_violation_in_one_query(self):
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        good, bad = [
+            MonthlyMileageLog.objects.create(
+                vehicle=vehicle, year=2024, month=month,
+                start_odometer_reading=start, end_odometer_reading=start,
+            )
+            for month, start in ((5, 1000), (6, 1020))
+        ]
+        bulk_ingest_entries([
+            {'monthly_log': good.pk, 'entry_date': '2024-05-01', 'start_mileage': 1000, 'end_mileage': 1020},
+            {'monthly_log': bad.pk, 'entry_date': '2024-06-01', 'start_mileage': 1025, 'end_mileage': 1030},
+        ])
+        MonthlyMileageLog.objects.filter(pk=bad.pk).update(total_distance_logged=7)
+
+        with self.assertNumQueries(1):
+            violations = audit_monthly_logs()
+        self.assertEqual(
+            sorted((v['log_id'], v['check']) for v in violations),
+            [(bad.pk, 'distance'), (bad.pk, 'first_start'), (bad.pk, 'stored_total')],
+        )
+        self.assertEqual(audit_monthly_logs(year_from=2025), [])
+
+
+class MileageLogEntryChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with cls.captureOnCommitCallbacks(execute=True):
+            Member.objects.create(name="Alice", email="alice@example.com")
+            Member.objects.create(name="Bob", email="bob@example.com")
+
+    def changelist_queries(self, month, size):
+        log = MonthlyMileageLog.objects.create(
+            vehicle=self.vehicle, year=2024, month=month,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(log, size, members=("Bob", "Alice")))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:mileage_logs_mileagelogentry_changelist'), {'monthly_log__id__exact': log.pk})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_independent_of_page_size(self):
+        self.client.force_login(self.user)
+        response, small = self.changelist_queries(5, 3)
+        self.assertContains(response, "Alice (1 seats)")
+        _, large = self.changelist_queries(6, 60)
+        self.assertEqual(small, large)
+
+
+class AllocationTests(TestCase):
+    def test_shares_are_seat_weighted(self):
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with self.captureOnCommitCallbacks(execute=True):
+            Member.objects.create(name="Alice", email="alice@example.com")
+            Member.objects.create(name="Bob", email="bob@example.com")
+        logs = [
+            MonthlyMileageLog.objects.create(
+                vehicle=vehicle, year=2024, month=month,
+                start_odometer_reading=1000, end_odometer_reading=1000,
+            )
+            for month in (5, 6)
+        ]
+        bulk_ingest_entries([
+            {'monthly_log': logs[0].pk, 'entry_date': '2024-05-01', 'start_mileage': 1000, 'end_mileage': 1030,
+             'claims': [{'member': "Alice", 'seats': 2}, {'member': "Bob"}]},
+            {'monthly_log': logs[0].pk, 'entry_date': '2024-05-02', 'start_mileage': 1030, 'end_mileage': 1040,
+             'claims': [{'member': "Bob"}]},
+            {'monthly_log': logs[1].pk, 'entry_date': '2024-06-01', 'start_mileage': 1040, 'end_mileage': 1100,
+             'claims': [{'member': "Alice"}]},
+        ])
+
+        with self.assertNumQueries(1):
+            rows = allocate_member_miles(start=(2024, 5), end=(2024, 5))
+        self.assertEqual(
+            [(r['member_name'], r['trips'], r['miles']) for r in rows],
+            [("Alice", 1, Decimal('20.00')), ("Bob", 2, Decimal('20.00'))],
+        )
+        self.assertEqual(allocate_member_miles(start=(2024, 6))[0]['miles'], Decimal('60.00'))
+
+
+class MemberMonthlyUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.alice = Member.objects.create(name="Alice", email="alice@example.com")
+            cls.bob = Member.objects.create(name="Bob", email="bob@example.com")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=5,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries([
+            {'monthly_log': cls.log.pk, 'entry_date': '2024-05-01', 'start_mileage': 1000, 'end_mileage': 1030,
+             'is_long_distance': True, 'claims': [{'member': "Alice", 'seats': 2}, {'member': "Bob"}]},
+        ])
+
+    def usage(self, member):
+        return MemberMonthlyUsage.objects.filter(member=member, year=2024, month=5).values_list(
+            'trips', 'seat_miles', 'long_distance_miles', 'allocated_miles').first()
+
+    def test_rollup_follows_claims_and_entries(self):
+        self.assertEqual(self.usage(self.alice), (1, 60, 60, 20))
+        self.assertEqual(self.usage(self.bob), (1, 30, 30, 10))
+
+        entry = MileageLogEntry.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            MileageClaim.objects.get(member=self.alice).delete()
+        self.assertIsNone(self.usage(self.alice))
+        self.assertEqual(self.usage(self.bob), (1, 30, 30, 30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.end_mileage = 1010
+            entry.is_long_distance = False
+            entry.save()
+        self.assertEqual(self.usage(self.bob), (1, 10, 0, 10))
+
+    def test_rollup_follows_long_distance_flag(self):
+        entry = MileageLogEntry.objects.get()
+        entry.is_long_distance = False
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save(update_fields=['is_long_distance'])
+        self.assertEqual(self.usage(self.alice), (1, 60, 0, 20))
+
+        entry.is_long_distance = True
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertEqual(self.usage(self.alice), (1, 60, 60, 20))
+
+    def test_rollup_moves_with_its_log(self):
+        truck = Vehicle.objects.create(name="Truck", year=2021, make="Ford", model="F-150")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log.vehicle = truck
+            self.log.month = 6
+            self.log.save()
+        self.assertEqual(
+            sorted(MemberMonthlyUsage.objects.values_list('member__name', 'vehicle', 'year', 'month')),
+            [("Alice", truck.pk, 2024, 6), ("Bob", truck.pk, 2024, 6)],
+        )
+
+    def test_unchanged_rows_are_left_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            refresh_member_usage(log_ids=[self.log.pk])
+        self.assertFalse([q for q in queries if q['sql'].startswith(('DELETE', 'INSERT', 'UPDATE'))])
+
+        MileageClaim.objects.filter(member=self.bob).update(number_of_seats_claimed=2)
+        with CaptureQueriesContext(connection) as queries:
+            refresh_member_usage(log_ids=[self.log.pk])
+        self.assertEqual([q['sql'].split()[0] for q in queries if not q['sql'].startswith('SELECT')], ['UPDATE'])
+        self.assertEqual(self.usage(self.bob), (1, 60, 60, 15))
+
+    def test_rebuild_command(self):
+        MemberMonthlyUsage.objects.all().delete()
+        call_command('rebuild_member_usage', stdout=StringIO())
+        self.assertEqual(self.usage(self.alice), (1, 60, 60, 20))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with cls.captureOnCommitCallbacks(execute=True):
+            Member.objects.create(name="Alice", email="alice@example.com")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=vehicle, year=2024, month=5,
+            start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(cls.log, 3))
+
+    def test_admin_action_streams_csv(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:mileage_logs_monthlymileagelog_changelist'), {
+            'action': 'export_entries_csv', '_selected_action': [self.log.pk],
+        })
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1], "Van,2024,5,2024-05-01,1000,1010,10,,,False,Alice (1 seats),1")
+
+    def test_admin_action_streams_xlsx(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('admin:mileage_logs_monthlymileagelog_changelist'), {
+                'action': 'export_entries_xlsx', '_selected_action': [self.log.pk],
+            })
+        self.assertTrue(response.streaming)
+        # The entries are read as the body is sent, not before the response is returned
+        self.assertFalse([q for q in ctx.captured_queries if 'mileage_logs_mileagelogentry' in q['sql']])
+        rows = list(load_workbook(BytesIO(b"".join(response.streaming_content))).active.values)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:3], ("Van", 2024, 5))
+
+        async def read(chunks):
+            return b"".join([chunk async for chunk in chunks])
+        content = async_to_sync(read)(exports.aiter_xlsx(exports.export_rows()))
+        self.assertEqual(list(load_workbook(BytesIO(content)).active.values)[1:], rows[1:])
+
+    def test_command_writes_xlsx(self):
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as f:
+            call_command('export_mileage', format='xlsx', output=f.name)
+            rows = list(load_workbook(f.name).active.values)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][0], "Van")
+
+
+class ReportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with cls.captureOnCommitCallbacks(execute=True):
+            Member.objects.create(name="Alice", email="alice@example.com")
+            Member.objects.create(name="Bob", email="bob@example.com")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=vehicle, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries([
+            {'monthly_log': cls.log.pk, 'entry_date': '2024-05-01', 'start_mileage': 1000, 'end_mileage': 1030,
+             'is_long_distance': True, 'claims': [{'member': "Alice", 'seats': 2}, {'member': "Bob"}]},
+            {'monthly_log': cls.log.pk, 'entry_date': '2024-05-02', 'start_mileage': 1030, 'end_mileage': 1040,
+             'claims': [{'member': "Bob"}]},
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_monthly_log_summary(self):
+        url = reverse('monthly_log_summary', args=[self.log.pk])
+        data = self.client.get(url).json()
+        self.assertEqual(
+            (data['vehicle'], data['entry_count'], data['total_distance_logged'], data['long_distance_miles']),
+            ("Van", 2, "40.0", "30"),
+        )
+        self.assertEqual([(m['member__name'], m['trips']) for m in data['members']], [("Alice", 1), ("Bob", 2)])
+        self.assertEqual(self.client.get(reverse('monthly_log_summary', args=[0])).status_code, 404)
+
+    def test_monthly_log_summary_follows_member_rename(self):
+        url = reverse('monthly_log_summary', args=[self.log.pk])
+        self.client.get(url)
+        alice = Member.objects.get(name="Alice")
+        alice.name = "Alicia"
+        with self.captureOnCommitCallbacks(execute=True):
+            alice.save()
+        data = self.client.get(url).json()
+        self.assertEqual([m['member__name'] for m in data['members']], ["Alicia", "Bob"])
+
+    def test_member_miles(self):
+        url = reverse('member_miles_report')
+        data = self.client.get(url, {'from': '2024-05', 'to': '2024-05'}).json()
+        self.assertEqual([(m['member_name'], m['miles']) for m in data['members']], [("Alice", "20.00"), ("Bob", "20.00")])
+        self.assertEqual(self.client.get(url, {'from': 'May'}).status_code, 400)
+
+    def test_async_views_match_sync_views(self):
+        factory = RequestFactory()
+        for async_view, sync_view, path, args in [
+            (views.amonthly_log_summary_view, views.monthly_log_summary_view, '/', [self.log.pk]),
+            (views.amember_miles_view, views.member_miles_view, '/?from=2024-05', []),
+        ]:
+            cache.clear()
+            expected = sync_view(factory.get(path), *args).content
+            cache.clear()
+            self.assertEqual(async_to_sync(async_view)(factory.get(path), *args).content, expected)
+
+
+class MonthRolloverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.logged = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.new = Vehicle.objects.create(name="Car", year=2022, make="Honda", model="Fit", current_mileage=500)
+        Vehicle.objects.create(name="Old", year=2001, make="Ford", model="Taurus", is_active=False)
+        log = MonthlyMileageLog.objects.create(
+            vehicle=cls.logged, year=2024, month=12, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(log, 3, members=()))
+
+    def opened(self):
+        return dict(MonthlyMileageLog.objects.filter(year=2025, month=1).values_list('vehicle__name', 'start_odometer_reading'))
+
+    def test_opens_logs_from_the_previous_end_reading(self):
+        self.assertEqual(len(open_monthly_logs(2025, 1)), 2)
+        self.assertEqual(self.opened(), {"Van": Decimal(1030), "Car": Decimal(500)})
+        log = MonthlyMileageLog.objects.get(vehicle=self.new, year=2025, month=1)
+        self.assertEqual((log.end_odometer_reading, log.total_distance_logged), (Decimal(500), Decimal(0)))
+
+    def test_rollover_is_idempotent(self):
+        MonthlyMileageLog.objects.create(
+            vehicle=self.new, year=2025, month=1, start_odometer_reading=600, end_odometer_reading=600,
+        )
+        open_monthly_logs(2025, 1)
+        self.assertEqual(open_monthly_logs(2025, 1), [])
+        self.assertEqual(self.opened(), {"Van": Decimal(1030), "Car": Decimal(600)})
+
+    def test_query_count_is_flat(self):
+        counts = []
+        for month, fleet in ((2, 5), (3, 50)):
+            Vehicle.objects.bulk_create([
+                Vehicle(name=f"Fleet {month}-{i}", year=2020, make="Ford", model="Transit") for i in range(fleet)
+            ])
+            with CaptureQueriesContext(connection) as ctx:
+                open_monthly_logs(2025, month)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('open_monthly_logs', month='2025-01', stdout=out)
+        self.assertIn("Opened 2 monthly logs for 2025-01", out.getvalue())
+        for month, message in [("2025-13", "Invalid month '2025-13'"), ("2025", "Expected a month as YYYY-MM, got '2025'")]:
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('open_monthly_logs', month=month, stdout=out)
+
+
+class MonthBoundaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        van = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        car = Vehicle.objects.create(name="Car", year=2022, make="Honda", model="Fit")
+        for vehicle, readings in ((van, [(1000, 1100), (1100, 1200), (1250, 1300)]), (car, [(500, 600), (580, 700)])):
+            MonthlyMileageLog.objects.bulk_create([
+                MonthlyMileageLog(vehicle=vehicle, year=2024, month=month, start_odometer_reading=start, end_odometer_reading=end)
+                for month, (start, end) in enumerate(readings, start=1)
+            ])
+
+    def test_gaps_and_overlaps_in_one_query(self):
+        with self.assertNumQueries(1):
+            breaks = month_boundary_breaks()
+        self.assertEqual(
+            [(b['vehicle'], b['month'], b['next_month'], b['kind'], b['difference']) for b in breaks],
+            [("Car", 1, 2, 'overlap', Decimal(-20)), ("Van", 2, 3, 'gap', Decimal(50))],
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('check_month_continuity', vehicle="Van", stdout=out)
+        self.assertIn("Van 2024-02 -> 2024-03: gap of 50", out.getvalue())
+        self.assertIn("1 month boundary breaks found.", out.getvalue())
+
+    def test_admin_report(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:mileage_logs_monthlymileagelog_continuity'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['breaks']), 2)
+        changelist = self.client.get(reverse('admin:mileage_logs_monthlymileagelog_changelist'))
+        self.assertContains(changelist, reverse('admin:mileage_logs_monthlymileagelog_continuity'))
+
+
+class GenerateFleetTests(TestCase):
+    def generate(self):
+        call_command('generate_fleet', vehicles=2, members=6, years=1, trips_per_month=6, seed=7, stdout=StringIO())
+        return list(MileageLogEntry.objects.order_by('vehicle__name', 'year', 'month', 'entry_date', 'start_mileage').values_list(
+            'vehicle__name', 'entry_date', 'start_mileage', 'end_mileage', 'mileageclaim__member__name',
+        ))
+
+    def test_history_is_continuous_and_checksum_valid(self):
+        self.generate()
+        self.assertEqual(MonthlyMileageLog.objects.count(), 24)
+        self.assertTrue(MemberAlias.objects.exists())
+        self.assertEqual(audit_monthly_logs(), [])
+        self.assertEqual(continuity_breaks(per_vehicle=True), [])
+        self.assertEqual(month_boundary_breaks(), [])
+        self.assertEqual(MemberMonthlyUsage.objects.values('monthly_log').distinct().count(), 24)
+
+    def test_seed_makes_it_reproducible(self):
+        first = self.generate()
+        for model in (Vehicle, Member):
+            model.objects.all().delete()
+        self.assertEqual(self.generate(), first)
+
+
+class BenchmarkComparisonTests(TestCase):
+    def test_more_queries_or_slower_runs_are_regressions(self):
+        baseline = {'results': {'2': {
+            'entry_save': {'seconds': 1.0, 'queries': 100},
+            'audit_monthly_logs': {'seconds': 0.1, 'queries': 1},
+        }}}
+        results = {'results': {'2': {
+            'entry_save': {'seconds': 1.2, 'queries': 101},
+            'audit_monthly_logs': {'seconds': 0.2, 'queries': 1},
+            'new_benchmark': {'seconds': 9.0, 'queries': 99},
+        }}}
+        self.assertEqual(compare_benchmarks(results, baseline, tolerance=0.5), [
+            "entry_save @ 2: 100 -> 101 queries",
+            "audit_monthly_logs @ 2: 0.1000s -> 0.2000s",
+        ])
+
+
+class PagedLogAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=vehicle, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(cls.log, 28, members=()))
+        cls.url = reverse('admin:mileage_logs_monthlymileagelog_change', args=[cls.log.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def entry_formset(self, response):
+        return next(inline.formset for inline in response.context['inline_admin_formsets'] if inline.formset.prefix == 'log_entries')
+
+    def post_page(self, entries, changes):
+        data = {
+            'vehicle': self.log.vehicle_id, 'year': 2024, 'month': 5,
+            'start_odometer_reading': 1000, 'end_odometer_reading': 1280,
+            'log_entries-TOTAL_FORMS': len(entries), 'log_entries-INITIAL_FORMS': len(entries),
+            'log_entries-MIN_NUM_FORMS': 0, 'log_entries-MAX_NUM_FORMS': 1000,
+            '_save': 'Save',
+        }
+        for i, entry in enumerate(entries):
+            prefix = f'log_entries-{i}'
+            data.update({
+                f'{prefix}-id': entry.pk, f'{prefix}-monthly_log': self.log.pk,
+                f'{prefix}-entry_date': entry.entry_date.isoformat(),
+                f'{prefix}-start_mileage': entry.start_mileage, f'{prefix}-end_mileage': entry.end_mileage,
+                f'{prefix}-destination': entry.destination, f'{prefix}-purpose': entry.purpose,
+                f'{prefix}-mileageclaim_set-TOTAL_FORMS': 0, f'{prefix}-mileageclaim_set-INITIAL_FORMS': 0,
+                f'{prefix}-mileageclaim_set-MIN_NUM_FORMS': 0, f'{prefix}-mileageclaim_set-MAX_NUM_FORMS': 1000,
+            })
+            data.update({f'{prefix}-{field}': value for field, value in changes.get(entry.pk, {}).items()})
+        return self.client.post(self.url, data)
+
+    def test_entries_are_edited_a_page_at_a_time(self):
+        first = self.entry_formset(self.client.get(self.url))
+        self.assertEqual(len(first.initial_forms), 25)
+        self.assertFalse(first.page.has_previous())
+
+        second = self.entry_formset(self.client.get(self.url, {'entries_after': first.page.next_cursor}))
+        self.assertEqual([form.instance.start_mileage for form in second.initial_forms], [1250, 1260, 1270])
+        self.assertTrue(second.page.has_previous())
+        self.assertEqual(self.client.get(self.url, {'entries_after': 'junk'}).status_code, 404)
+
+    def test_only_changed_rows_are_validated_and_saved(self):
+        entries = list(MileageLogEntry.objects.filter(monthly_log=self.log)[:25])
+        stamps = dict(MileageLogEntry.objects.values_list('pk', 'updated_at'))
+        response = self.post_page(entries, {entries[3].pk: {'destination': "Quincy"}})
+        self.assertEqual(response.status_code, 302)
+        changed = [pk for pk, updated_at in MileageLogEntry.objects.values_list('pk', 'updated_at') if updated_at != stamps[pk]]
+        self.assertEqual(changed, [entries[3].pk])
+
+    def test_continuity_is_checked_against_rows_not_submitted(self):
+        entries = list(MileageLogEntry.objects.filter(monthly_log=self.log)[:25])
+        response = self.post_page(entries, {entries[24].pk: {'start_mileage': 1241, 'end_mileage': 1250}})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('start_mileage', self.entry_formset(response).forms[24].errors)
+
+    def test_claims_get_a_blank_form_only_on_new_entries(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'name="log_entries-0-mileageclaim_set-TOTAL_FORMS" value="0"')
+        self.assertContains(response, 'name="log_entries-25-mileageclaim_set-TOTAL_FORMS" value="1"')
+
+
+class EntryGridTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.alice = Member.objects.create(name="Alice", email="alice@example.com")
+            cls.bob = Member.objects.create(name="Bob Baker", email="bob@example.com")
+            MemberAlias.objects.create(name="Al", member=cls.alice)
+        cls.log = MonthlyMileageLog.objects.create(
+            vehicle=vehicle, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries(make_rows(cls.log, 1))
+        cls.url = reverse('admin:mileage_logs_monthlymileagelog_grid', args=[cls.log.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post_sheet(self, rows):
+        # Plus a blank row, which is ignored
+        data = {'trips-TOTAL_FORMS': len(rows) + 1, 'trips-INITIAL_FORMS': 0, '_save': 'Save'}
+        for i, row in enumerate(rows):
+            data.update({f'trips-{i}-{field}': value for field, value in row.items()})
+        return self.client.post(self.url, data)
+
+    def sheet(self, count, start=1010, day=2, claims="Al:2, bob  baker"):
+        return [
+            {'entry_date': f'2024-05-{day + i * (29 - day) // count:02d}', 'start_mileage': start + i * 10, 'end_mileage': start + i * 10 + 10,
+             'destination': "Quincy", 'claims': claims}
+            for i in range(count)
+        ]
+
+    def test_sheet_is_saved_in_one_batch(self):
+        self.assertContains(self.client.get(reverse('admin:mileage_logs_monthlymileagelog_change', args=[self.log.pk])), self.url)
+        self.assertEqual(len(self.client.get(self.url, {'rows': 40}).context['formset'].forms), 40)
+        self.assertEqual(self.client.get(reverse('admin:mileage_logs_monthlymileagelog_grid', args=['x'])).status_code, 404)
+
+        response = self.post_sheet(self.sheet(3))
+        self.assertRedirects(response, reverse('admin:mileage_logs_monthlymileagelog_change', args=[self.log.pk]))
+        self.assertEqual(
+            list(MileageClaim.objects.filter(mileage_log_entry__start_mileage=1010).values_list('member__name', 'number_of_seats_claimed')),
+            [("Alice", 2), ("Bob Baker", 1)],
+        )
+        self.log.refresh_from_db()
+        self.assertEqual((self.log.end_odometer_reading, self.log.total_distance_logged), (1040, 40))
+
+    def test_queries_dont_grow_with_the_sheet(self):
+        # The first sheet also creates Bob's usage row; the others only update the rows
+        self.post_sheet(self.sheet(1, day=2))
+        with CaptureQueriesContext(connection) as small:
+            self.post_sheet(self.sheet(2, start=1020, day=3))
+        with CaptureQueriesContext(connection) as large:
+            self.post_sheet(self.sheet(30, start=1040, day=16))
+        self.assertEqual(MileageLogEntry.objects.filter(monthly_log=self.log).count(), 34)
+        self.assertEqual(len(large), len(small))
+
+    def test_sheet_is_validated_as_a_whole(self):
+        rows = self.sheet(4)
+        rows[1]['entry_date'] = '2024-06-01'
+        rows[2]['start_mileage'] = 1031
+        rows[3]['claims'] = "Alise, Al:0"
+        response = self.post_sheet(rows)
+        self.assertEqual(response.status_code, 200)
+        forms = response.context['formset'].forms
+        self.assertFalse(forms[0].errors)
+        self.assertIn('entry_date', forms[1].errors)
+        self.assertIn("previous entry's end mileage (1020)", forms[2].errors['start_mileage'][0])
+        self.assertEqual(forms[3].errors['claims'], [
+            'No member is called "Alise"; did you mean "Alice"?',
+            '"0" is not a number of seats for Al.',
+        ])
+        self.assertEqual(MileageLogEntry.objects.filter(monthly_log=self.log).count(), 1)
+
+    def test_conflicting_writes_rerender_the_sheet(self):
+        with mock.patch.object(MileageClaim.objects, 'bulk_create', side_effect=IntegrityError("UNIQUE constraint failed")):
+            response = self.post_sheet(self.sheet(2))
+        self.assertContains(response, "conflict with changes saved meanwhile")
+        with mock.patch('mileage_logs.admin.bulk_ingest_entries', side_effect=IntegrityError("UNIQUE constraint failed")):
+            response = self.post_sheet(self.sheet(2))
+        self.assertContains(response, "The sheet conflicts with trips saved meanwhile; nothing was written.")
+        self.assertEqual(response.context['formset'].forms[0].cleaned_data['start_mileage'], 1010)
+        self.assertEqual(MileageLogEntry.objects.filter(monthly_log=self.log).count(), 1)
+
+    def test_sheet_must_continue_the_logs_entries(self):
+        response = self.post_sheet(self.sheet(1, start=1000))
+        self.assertIn('start_mileage', response.context['formset'].forms[0].errors)
+        response = self.post_sheet([])
+        self.assertEqual(response.context['formset'].non_form_errors(), ["Enter at least one trip."])
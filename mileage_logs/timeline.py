@@ -0,0 +1,100 @@
+"""
+Odometer timelines for charts.
+
+A vehicle's odometer series is one point per MileageLogEntry: its start and end
+readings on the entry date, so gaps between trips show. Ten years of trips are tens of thousands of points, far more than a chart
+can show, so the series is downsampled with Largest-Triangle-Three-Buckets (LTTB) on
+the end readings, which keeps the points that carry the shape of the line (the first
+and last points always survive). The MonthlyMileageLog start/end readings are returned alongside as
+month boundaries.
+"""
+import datetime
+import hashlib
+
+from django.db.models import Count, Max
+
+from .models import MonthlyMileageLog, MileageLogEntry
+
+
+def lttb(points, threshold):
+    """
+    Downsamples a list of (x, y) points, sorted by x, to at most threshold points using
+    Largest-Triangle-Three-Buckets. Returns the selected points in order. Points may be
+    longer tuples, (x, y, ...), whose further items are carried along.
+    """
+    if threshold >= len(points):
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    # The points between the first and last are split into threshold - 2 buckets
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = points[0]
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # The next bucket's average point is the third corner of the triangle
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_points = points[next_start:next_end] or [points[-1]]
+        average_x = sum(point[0] for point in next_points) / len(next_points)
+        average_y = sum(point[1] for point in next_points) / len(next_points)
+
+        best, best_area = None, -1
+        previous_x, previous_y = previous[:2]
+        for point in points[start:end]:
+            x, y = point[:2]
+            area = abs((previous_x - average_x) * (y - previous_y) - (previous_x - x) * (average_y - previous_y))
+            if area > best_area:
+                best, best_area = point, area
+        sampled.append(best)
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def odometer_series(vehicle):
+    """Returns a vehicle's (entry date ordinal, end reading, start reading) points, in trip order."""
+    rows = MileageLogEntry.objects.filter(vehicle=vehicle).order_by('entry_date', 'start_mileage', 'pk').values_list(
+        'entry_date', 'end_mileage', 'start_mileage',
+    )
+    return [
+        (entry_date.toordinal(), float(end_mileage), float(start_mileage))
+        for entry_date, end_mileage, start_mileage in rows.iterator(chunk_size=5000)
+    ]
+
+
+def odometer_timeline(vehicle, points=500):
+    """
+    Returns a JSON-ready dict with the vehicle's odometer series downsampled to at most
+    points points, and the start/end readings of each of its monthly logs.
+    """
+    series = odometer_series(vehicle)
+    months = MonthlyMileageLog.objects.filter(vehicle=vehicle).order_by('year', 'month').values_list(
+        'year', 'month', 'start_odometer_reading', 'end_odometer_reading',
+    )
+    return {
+        'vehicle': getattr(vehicle, 'pk', vehicle),
+        'total_points': len(series),
+        'points': [
+            {'date': datetime.date.fromordinal(x).isoformat(), 'start': start, 'end': end}
+            for x, end, start in lttb(series, points)
+        ],
+        'months': [
+            {'year': year, 'month': month, 'start': float(start), 'end': float(end)}
+            for year, month, start, end in months
+        ],
+    }
+
+
+def timeline_version(vehicle):
+    """
+    Returns a digest of the number and latest update time of a vehicle's monthly logs
+    and entries, read in one query, which changes whenever its timeline does.
+    """
+    state = MonthlyMileageLog.objects.filter(vehicle=vehicle).aggregate(
+        logs=Count('pk', distinct=True), logs_updated=Max('updated_at'),
+        entries=Count('log_entries'), entries_updated=Max('log_entries__updated_at'),
+    )
+    return hashlib.sha256(repr(sorted(state.items())).encode()).hexdigest()[:16]
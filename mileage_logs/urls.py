@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('reports/monthly-logs/<int:pk>/', views.amonthly_log_summary_view, name="monthly_log_summary"),
+    path('reports/member-miles/', views.amember_miles_view, name="member_miles_report"),
+]
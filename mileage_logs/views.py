@@ -1,3 +1,52 @@
-from django.shortcuts import render
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from .models import MonthlyMileageLog
+from .months import parse_year_month
+from .reports import amember_miles_report, amonthly_log_summary, member_miles_report, monthly_log_summary
+
+
+def _member_miles_arguments(request):
+    """Parses ?from=YYYY-MM&to=YYYY-MM&vehicle=<id>; raises ValueError if they're malformed."""
+    start = parse_year_month(request.GET['from']) if request.GET.get('from') else None
+    end = parse_year_month(request.GET['to']) if request.GET.get('to') else None
+    vehicle_id = int(request.GET['vehicle']) if request.GET.get('vehicle') else None
+    return start, end, vehicle_id
+
+
+@require_GET
+async def amonthly_log_summary_view(request, pk):
+    """A monthly log's totals and per-member usage as JSON."""
+    try:
+        return JsonResponse(await amonthly_log_summary(pk))
+    except MonthlyMileageLog.DoesNotExist:
+        raise Http404("No such monthly log")
+
+
+@require_GET
+async def amember_miles_view(request):
+    """Each member's seat-weighted miles in a range of months as JSON."""
+    try:
+        arguments = _member_miles_arguments(request)
+    except ValueError:
+        return HttpResponseBadRequest("Expected ?from=YYYY-MM&to=YYYY-MM&vehicle=<id>")
+    return JsonResponse({'members': await amember_miles_report(*arguments)})
+
+
+# The synchronous equivalents, kept for the loadtest command
+
+@require_GET
+def monthly_log_summary_view(request, pk):
+    try:
+        return JsonResponse(monthly_log_summary(pk))
+    except MonthlyMileageLog.DoesNotExist:
+        raise Http404("No such monthly log")
+
+
+@require_GET
+def member_miles_view(request):
+    try:
+        arguments = _member_miles_arguments(request)
+    except ValueError:
+        return HttpResponseBadRequest("Expected ?from=YYYY-MM&to=YYYY-MM&vehicle=<id>")
+    return JsonResponse({'members': member_miles_report(*arguments)})
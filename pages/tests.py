@@ -1,3 +1,75 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from ___.metrics import BudgetExceeded, registry
+from ___.test_runner import test_budgets
+from mileage_logs.models import MonthlyMileageLog
+from vehicles.models import Vehicle
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user("staff", "staff@example.com", "password", is_staff=True)
+        cls.user = get_user_model().objects.create_user("user", "user@example.com", "password")
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def metrics(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.get(reverse('member_list'))
+        self.client.get(reverse('member_list'))
+        lines = self.metrics()
+        self.assertIn('drvc_request_duration_seconds_count{view="member_list"} 2', lines)
+        queries = next(line for line in lines if line.startswith('drvc_request_queries_sum{view="member_list"}'))
+        self.assertGreater(int(queries.split()[-1]), 0)
+
+    def test_async_views_queries_are_counted(self):
+        async_to_sync(AsyncClient().get)(reverse('vehicle_list'))
+        lines = self.metrics()
+        self.assertIn('drvc_request_queries_count{view="vehicle_list"} 1', lines)
+        self.assertNotIn('drvc_request_queries_sum{view="vehicle_list"} 0', lines)
+
+    def test_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(REQUEST_BUDGETS={'default': {'queries': 50}, 'member_list': {'queries': 0}})
+    def test_over_budget_requests_are_logged(self):
+        with override_settings(REQUEST_BUDGET_ACTION='log'), self.assertLogs('___.metrics', 'WARNING') as logs:
+            self.assertEqual(self.client.get(reverse('member_list')).status_code, 200)
+        self.assertIn("(member_list) exceeded its budget", logs.output[0])
+        self.assertIn('drvc_request_over_budget_total{view="member_list",budget="queries"} 1', self.metrics())
+
+    @override_settings(REQUEST_BUDGETS={'member_list': {'queries': 0}}, REQUEST_BUDGET_ACTION='raise')
+    def test_over_budget_requests_raise_under_tests(self):
+        with self.assertRaises(BudgetExceeded):
+            self.client.get(reverse('member_list'))
+
+    def test_streaming_responses_are_measured_once_sent(self):
+        self.client.force_login(self.staff)
+        get_user_model().objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        log = MonthlyMileageLog.objects.create(vehicle=vehicle, year=2024, month=5, start_odometer_reading=0, end_odometer_reading=0)
+        view = 'admin:mileage_logs_monthlymileagelog_changelist'
+        response = self.client.post(reverse(view), {'action': 'export_entries_csv', '_selected_action': [log.pk]})
+        self.assertNotIn(f'drvc_request_queries_count{{view="{view}"}} 1', registry.render().splitlines())
+        with override_settings(REQUEST_BUDGETS={view: {'queries': 1}}), self.assertRaises(BudgetExceeded):
+            b"".join(response.streaming_content)
+        self.assertIn(f'drvc_request_queries_count{{view="{view}"}} 1', registry.render().splitlines())
+
+    def test_timings_are_not_enforced_under_tests(self):
+        with override_settings(REQUEST_BUDGETS={'member_list': {'time': 0, 'db_time': 0}}):
+            with test_budgets():
+                self.assertEqual(self.client.get(reverse('member_list')).status_code, 200)
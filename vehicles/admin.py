@@ -5,14 +5,14 @@ from .models import Vehicle
 class VehicleAdmin(admin.ModelAdmin):
     list_display = (
         'name', 'year', 'make', 'model', 'fuel_type',
-        'license_plate', 'current_mileage', 'updated_at'
+        'license_plate', 'current_mileage', 'is_active', 'updated_at'
     )
-    list_filter = ('fuel_type', 'year', 'make')
+    list_filter = ('is_active', 'fuel_type', 'year', 'make')
     search_fields = ('name', 'make', 'model', 'license_plate', 'vin')
     date_hierarchy = 'purchase_date'
     fieldsets = (
         (None, {
-            'fields': ('name', ('year', 'make', 'model'), 'fuel_type')
+            'fields': ('name', ('year', 'make', 'model'), 'fuel_type', 'is_active')
         }),
         ('Purchase Details', {
             'fields': (('purchase_price', 'purchase_date'),),
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_alter_vehicle_current_mileage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['name', 'id'], name='vehicle_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0004_vehicle_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Whether the vehicle is still in use; monthly logs are only opened for active vehicles'),
+        ),
+    ]
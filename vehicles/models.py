@@ -35,6 +35,7 @@ class Vehicle(models.Model):
     license_plate = models.CharField(max_length=20, blank=True, help_text="License plate number for the vehicle (optional)")
     vin = models.CharField(max_length=17, blank=True, null=True, unique=True, help_text="Vehicle Identification Number (optional, 17 characters)")
     current_mileage = models.DecimalField(max_digits=10, decimal_places=1, default=0.0, help_text="Current odometer reading of the vehicle")
+    is_active = models.BooleanField(default=True, help_text="Whether the vehicle is still in use; monthly logs are only opened for active vehicles")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -44,4 +45,8 @@ class Vehicle(models.Model):
     class Meta:
         verbose_name = "Vehicle"
         verbose_name_plural = "Vehicles"
-        ordering = ['name'] # Order by friendly name
\ No newline at end of file
+        ordering = ['name'] # Order by friendly name
+        indexes = [
+            # Keyset pagination of the vehicle list seeks on (name, id)
+            models.Index(fields=['name', 'id'], name='vehicle_name_id_idx'),
+        ]
\ No newline at end of file
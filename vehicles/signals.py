@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ___ import cache
+from .models import Vehicle
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_vehicle_caches(sender, using, **kwargs):
+    cache.invalidate_on_commit(cache.VEHICLES, cache.MILEAGE_LOGS, cache.REPORTS, using=using)
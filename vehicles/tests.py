@@ -1,3 +1,149 @@
+import datetime
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from ___ import pagination
+from ___.pagination import KeysetPaginator, encode_cursor
+from mileage_logs.ingest import bulk_ingest_entries
+from mileage_logs.models import MonthlyMileageLog, MileageLogEntry
+from mileage_logs.timeline import lttb
+from .models import Vehicle
+from .views import AsyncVehicleListView
+
+
+class VehicleListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_list_is_cached_until_a_vehicle_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        self.client.get(reverse('vehicle_list'))
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('vehicle_list')), "Van")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.name = "Bus"
+            vehicle.save()
+        self.assertContains(self.client.get(reverse('vehicle_list')), "Bus")
+
+
+class VehicleListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate names, so the pk has to break ties
+        Vehicle.objects.bulk_create([
+            Vehicle(name=f"Van {i // 2:02d}", year=2020, make="Ford", model="Transit") for i in range(9)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_follow_name_then_pk(self):
+        expected = list(Vehicle.objects.order_by('name', 'pk').values_list('pk', flat=True))
+        paginator = KeysetPaginator(Vehicle.objects.all(), 4)
+        seen, page = [], paginator.page()
+        while True:
+            seen.extend(vehicle.pk for vehicle in page)
+            if not page.has_next():
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, expected)
+
+        previous = paginator.page(before=page.previous_cursor)
+        self.assertEqual([vehicle.pk for vehicle in previous], expected[4:8])
+        self.assertTrue(previous.has_next())
+
+    def test_deep_pages_cost_one_query(self):
+        url = reverse('vehicle_list')
+        with patch.object(AsyncVehicleListView, 'paginate_by', 2):
+            response = self.client.get(url)
+            while response.context['page_obj'].has_next():
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, {'after': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['object_list']), 1)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get(reverse('vehicle_list'), {'after': 'not-a-cursor'}).status_code, 404)
+
+    def test_pages_are_cached_by_their_cursors_values(self):
+        url = reverse('vehicle_list')
+        for cursor in (encode_cursor(["Van"]), encode_cursor([["Van"], 1]), encode_cursor({'name': "Van"})):
+            self.assertEqual(self.client.get(url, {'after': cursor}).status_code, 404)
+
+        cursor = encode_cursor(["Van 01", Vehicle.objects.filter(name="Van 01").first().pk])
+        with patch('___.pagination.cache.acached', wraps=pagination.cache.acached) as cached:
+            first = self.client.get(url, {'after': cursor})
+            # The same values with the padding the encoding strips
+            second = self.client.get(url, {'after': cursor + '=' * (-len(cursor) % 4)})
+        keys = [call.args[1] for call in cached.call_args_list]
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotIn(cursor, str(keys[0]))
+        self.assertEqual(list(first.context['object_list']), list(second.context['object_list']))
+
+
+class OdometerTimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(name="Van", year=2020, make="Ford", model="Transit")
+        log = MonthlyMileageLog.objects.create(
+            vehicle=cls.vehicle, year=2024, month=5, start_odometer_reading=1000, end_odometer_reading=1000,
+        )
+        bulk_ingest_entries([
+            {'monthly_log': log.pk, 'entry_date': datetime.date(2024, 5, 1 + i // 40),
+             'start_mileage': 1000 + i * 5, 'end_mileage': 1005 + i * 5}
+            for i in range(1000)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lttb_keeps_the_ends_and_the_peaks(self):
+        points = [(x, 0) for x in range(100)]
+        points[37] = (37, 50)
+        sampled = lttb(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+        self.assertIn((37, 50), sampled)
+        self.assertEqual(lttb(points[:5], 10), points[:5])
+
+    def test_timeline_is_downsampled(self):
+        url = reverse('vehicle_odometer_timeline', args=[self.vehicle.pk])
+        data = self.client.get(url, {'points': 100}).json()
+        self.assertEqual(data['total_points'], 1000)
+        self.assertEqual(len(data['points']), 100)
+        self.assertEqual(data['points'][0], {'date': '2024-05-01', 'start': 1000.0, 'end': 1005.0})
+        self.assertEqual(data['points'][-1], {'date': '2024-05-25', 'start': 5995.0, 'end': 6000.0})
+        self.assertEqual(data['months'], [{'year': 2024, 'month': 5, 'start': 1000.0, 'end': 6000.0}])
+
+    def test_etag_changes_when_entries_do(self):
+        url = reverse('vehicle_odometer_timeline', args=[self.vehicle.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+        # Another vehicle's trips leave it alone
+        other = MonthlyMileageLog.objects.create(
+            vehicle=Vehicle.objects.create(name="Bus", year=2020, make="Ford", model="E-450"),
+            year=2024, month=5, start_odometer_reading=0, end_odometer_reading=0,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            MileageLogEntry.objects.create(monthly_log=other, entry_date=datetime.date(2024, 5, 1), start_mileage=0, end_mileage=10)
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+        entry = MileageLogEntry.objects.filter(vehicle=self.vehicle).first()
+        entry.entry_date = datetime.date(2024, 5, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save(update_fields=['entry_date'])
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            MileageLogEntry.objects.filter(entry_date__day=25).last().delete()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
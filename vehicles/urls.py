@@ -2,5 +2,6 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.VehicleListView.as_view(), name="vehicle_list"),
+    path('', views.AsyncVehicleListView.as_view(), name="vehicle_list"),
+    path('<int:pk>/odometer/', views.vehicle_odometer_timeline, name="vehicle_odometer_timeline"),
 ]
\ No newline at end of file
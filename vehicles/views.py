@@ -1,10 +1,56 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
 from django.views import generic
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from ___ import cache
+from ___.pagination import AsyncKeysetListView, KeysetPaginationMixin
+from mileage_logs.timeline import odometer_timeline, timeline_version
 from .models import Vehicle
 
+TIMELINE_POINTS = 500
+MAX_TIMELINE_POINTS = 5000
+
 # Create your views here.
-class VehicleListView(generic.ListView):
+class VehicleListMixin:
     model = Vehicle
     template_name = "vehicles/vehicle_list.html"
+    paginate_by = 50
+    # Each page is invalidated whenever a vehicle (or its mileage) changes; see vehicles.signals
+    cache_namespace = cache.VEHICLES
+
+    def get_queryset(self):
+        return super().get_queryset().only('name', 'purchase_price')
+
+
+class AsyncVehicleListView(VehicleListMixin, AsyncKeysetListView):
+    pass
+
+
+class VehicleListView(VehicleListMixin, KeysetPaginationMixin, generic.ListView):
+    """The synchronous equivalent of AsyncVehicleListView, kept for the loadtest command."""
+
+
+def _timeline_points(request):
+    try:
+        points = int(request.GET.get('points', TIMELINE_POINTS))
+    except ValueError:
+        points = TIMELINE_POINTS
+    return min(max(points, 2), MAX_TIMELINE_POINTS)
+
+
+def _timeline_etag(request, pk):
+    # Only changes with this vehicle's logs and entries, unlike the mileage_logs namespace version
+    return f'"{pk}-{_timeline_points(request)}-{timeline_version(pk)}"'
+
 
-    
\ No newline at end of file
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_timeline_etag)
+def vehicle_odometer_timeline(request, pk):
+    """The vehicle's odometer series, downsampled to ?points= points, as JSON for charts."""
+    vehicle = get_object_or_404(Vehicle.objects.only('pk'), pk=pk)
+    points = _timeline_points(request)
+    timeline = cache.cached(cache.MILEAGE_LOGS, ['odometer_timeline', pk, points], lambda: odometer_timeline(vehicle, points))
+    return JsonResponse(timeline)